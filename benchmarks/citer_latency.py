@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless latency benchmarks of Citer's interactive paths.
+
+Citer is loaded with stand-ins for the sublime and sublime_plugin modules
+(in this folder) and driven like the editor would: completions on each
+keystroke, hovers over citations, searches, the quick panel menu and
+library reloads, on a generated library. Each scenario reports the
+p50/p95/p99 latency of its calls.
+
+Run from the package folder:
+
+    python benchmarks/citer_latency.py --entries 10000 --output latency.json
+    python benchmarks/citer_latency.py --entries 10000 --compare latency.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)  # the stand-in sublime modules
+sys.path.insert(1, os.path.dirname(HERE))  # citer and bibtexparser
+
+import sublime
+import citer
+from bibtexparser.benchmarks.corpus import write_corpus
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'samples': len(samples),
+        'p50': citer._percentile(samples, 0.50),
+        'p95': citer._percentile(samples, 0.95),
+        'p99': citer._percentile(samples, 0.99),
+        'max': samples[-1],
+    }
+
+
+def timed(function, *args):
+    start = _clock()
+    function(*args)
+    return _clock() - start
+
+
+class Bench(object):
+    """A generated library, a document citing it, and Citer loaded on both"""
+
+    def __init__(self, entries, seed, lines):
+        self.random = random.Random(seed)
+        self.folder = tempfile.mkdtemp(prefix='citer-bench-')
+        self.bibpath = os.path.join(self.folder, 'library.bib')
+        write_corpus(self.bibpath, entries, seed=seed)
+
+        settings = sublime.load_settings('Citer.sublime-settings')
+        settings['bibtex_file'] = self.bibpath
+        self.window = sublime.active_window()
+        citer.plugin_loaded()
+
+        # parse once, to know the citekeys and titles to type
+        library = citer.Library([self.bibpath])
+        library.refresh()
+        self.citekeys = list(library.citekeys)
+        self.titles = [info['title'] for info in library.formatted_info.values()]
+        library.close()
+
+        self.view = sublime.View(text=self.document(lines),
+                                 file_name=os.path.join(self.folder, 'paper.md'),
+                                 window=self.window)
+        self.window.view = self.view
+        citer.CiterCitationChangeListener().attach(sublime.Buffer(self.view))
+        self.library = citer.library_for_view(self.view)
+        sublime.run_pending()
+
+    def close(self):
+        citer.release_view(self.view)
+        self.view.close()
+        shutil.rmtree(self.folder)
+
+    def document(self, lines):
+        rand = self.random
+        text = []
+        for _ in range(lines):
+            keys = rand.sample(self.citekeys, rand.randint(1, 3))
+            text.append('Some text about {0} [{1}], see also @{2}.'.format(
+                rand.choice(self.titles).lower(),
+                '; '.join('@' + key for key in keys), rand.choice(self.citekeys)))
+        return '\n'.join(text) + '\n'
+
+    def citation_points(self):
+        return [start + 1 for start, _, _ in citer.citation_index(self.view).citations()]
+
+    # scenarios, each returns the latencies of its calls, in seconds
+
+    def load_parse(self, repeat):
+        """Load the library from the bib file, without snapshot"""
+        samples = []
+        for _ in range(repeat):
+            shutil.rmtree(os.path.join(sublime.cache_path(), 'Citer'), ignore_errors=True)
+            samples.append(self.load_library())
+        return samples
+
+    def load_library(self):
+        """Time loading a library with a pool of its own, so that the
+        files already parsed for the document are not reused"""
+        pool = citer._BIBFILES
+        citer._BIBFILES = citer.BibFilePool(pool.budget)
+        try:
+            library = citer.Library([self.bibpath])
+            elapsed = timed(library.refresh)
+            library.close()
+        finally:
+            citer._BIBFILES = pool
+        return elapsed
+
+    def load_snapshot(self, repeat):
+        """Load the library from its snapshot, as after a restart"""
+        return [self.load_library() for _ in range(repeat)]
+
+    def refresh_unchanged(self, repeat):
+        """Refresh the document's library when no bib file changed"""
+        return [timed(self.library.refresh) for _ in range(repeat)]
+
+    def completions(self, repeat, matching):
+        """on_query_completions on each keystroke of a citekey or title word"""
+        citer.COMPLETION_MATCHING = matching
+        listener = citer.CiterCompleteCitationEventListener()
+        samples = []
+        for _ in range(repeat):
+            if self.random.random() < 0.5:
+                word = self.random.choice(self.citekeys)
+            else:
+                word = self.random.choice(self.random.choice(self.titles).split())
+            citer._COMPLETIONS_CACHE.pop(self.view.id(), None)
+            for length in range(1, min(len(word), 8) + 1):
+                samples.append(timed(listener.on_query_completions,
+                                     self.view, word[:length], [self.view.size()]))
+        return samples
+
+    def hover(self, repeat):
+        """on_hover over citations, with an edit every 10 hovers"""
+        listener = citer.CiterHoverEventListener()
+        samples = []
+        for count in range(repeat):
+            if count % 10 == 0:
+                point = self.random.randrange(self.view.size())
+                self.view.insert(None, point, '@' + self.random.choice(self.citekeys) + ' ')
+                points = self.citation_points()
+            point = self.random.choice(points)
+            samples.append(timed(listener.on_hover, self.view, point, sublime.HOVER_TEXT))
+        return samples
+
+    def search_typing(self, repeat):
+        """Citer: Search live results, for each keystroke"""
+        samples = []
+        for _ in range(repeat):
+            command = citer.CiterSearchCommand(self.view)
+            command.run(None)
+            on_done, on_change, _ = self.window.input_panel
+            query = ' '.join(self.random.choice(self.titles).split()[:2])
+            for length in range(1, len(query) + 1):
+                start = _clock()
+                on_change(query[:length])
+                sublime.run_pending()
+                samples.append(_clock() - start)
+        return samples
+
+    def search_command(self, repeat):
+        """Citer: Search, from enter to the quick panel, without live search"""
+        samples = []
+        for _ in range(repeat):
+            command = citer.CiterSearchCommand(self.view)
+            command.run(None)
+            on_done = self.window.input_panel[0]
+            query = self.random.choice(self.random.choice(self.titles).split())
+            samples.append(timed(on_done, query))
+        return samples
+
+    def menu(self, repeat):
+        """citekeys_menu, as used by Citer: Show All"""
+        samples = []
+        for _ in range(repeat):
+            samples.append(timed(citer.citekeys_menu, self.view))
+            sublime.run_pending()
+        return samples
+
+    def lint(self, repeat):
+        """lint_citations after an edit"""
+        samples = []
+        for _ in range(repeat):
+            point = self.random.randrange(self.view.size())
+            self.view.insert(None, point, '@' + self.random.choice(self.citekeys) + 'x ')
+            samples.append(timed(citer.lint_citations, self.view))
+        return samples
+
+
+SCENARIOS = [
+    ('load (parse)', lambda bench, repeat: bench.load_parse(max(1, repeat // 50))),
+    ('load (snapshot)', lambda bench, repeat: bench.load_snapshot(max(1, repeat // 10))),
+    ('refresh (unchanged)', lambda bench, repeat: bench.refresh_unchanged(repeat)),
+    ('completion keystroke (fuzzy)', lambda bench, repeat: bench.completions(repeat, 'fuzzy')),
+    ('completion keystroke (substring)', lambda bench, repeat: bench.completions(repeat, 'substring')),
+    ('hover', lambda bench, repeat: bench.hover(repeat)),
+    ('search keystroke', lambda bench, repeat: bench.search_typing(max(1, repeat // 10))),
+    ('search command', lambda bench, repeat: bench.search_command(repeat)),
+    ('citekeys_menu', lambda bench, repeat: bench.menu(repeat)),
+    ('lint', lambda bench, repeat: bench.lint(repeat)),
+]
+
+
+def run(entries, repeat=100, seed=0, lines=2000, names=None, report=None):
+    """
+    Run the scenarios on a library of entries.
+
+    :returns: dict -- results, json serialisable, latencies in seconds
+    """
+    bench = Bench(entries, seed, lines)
+    scenarios = {}
+    try:
+        for name, scenario in SCENARIOS:
+            if names and name not in names:
+                continue
+            scenarios[name] = summarize(scenario(bench, repeat))
+            if report is not None:
+                report(name, scenarios[name])
+    finally:
+        bench.close()
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+        },
+        'entries': entries,
+        'lines': lines,
+        'seed': seed,
+        'repeat': repeat,
+        'scenarios': scenarios,
+    }
+
+
+def format_summary(name, summary):
+    return '%-34s %6d calls  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms' % (
+        name, summary['samples'], 1000 * summary['p50'],
+        1000 * summary['p95'], 1000 * summary['p99'])
+
+
+def compare(old, new):
+    """Lines comparing the p50 and p95 of each scenario to a previous run"""
+    lines = []
+    if (old['entries'], old['seed']) != (new['entries'], new['seed']):
+        lines.append('warning: the libraries differ')
+    for name, summary in sorted(new['scenarios'].items()):
+        before = old['scenarios'].get(name)
+        if before and before['p50'] and before['p95']:
+            lines.append('%-34s p50 x%.2f  p95 x%.2f' % (
+                name, summary['p50'] / before['p50'], summary['p95'] / before['p95']))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless latency benchmarks of Citer.')
+    parser.add_argument('--entries', type=int, default=10000,
+                        help='entries in the generated library (default: 10000)')
+    parser.add_argument('--lines', type=int, default=2000,
+                        help='lines of the document citing it (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='calls per scenario, roughly (default: 100)')
+    parser.add_argument('--scenario', action='append', dest='names',
+                        choices=[name for name, _ in SCENARIOS],
+                        help='scenario to run, can be repeated (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help='compare with the results of a previous run')
+    args = parser.parse_args(argv)
+
+    def report(name, summary):
+        print(format_summary(name, summary))
+        sys.stdout.flush()
+
+    results = run(args.entries, repeat=args.repeat, seed=args.seed, lines=args.lines,
+                  names=args.names, report=report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as previous:
+            old = json.load(previous)
+        print('')
+        for line in compare(old, results):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
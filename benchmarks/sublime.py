@@ -0,0 +1,256 @@
+"""
+A minimal stand-in for Sublime Text's `sublime` module, enough to run
+Citer outside the editor for benchmarks (see citer_latency.py).
+
+Views hold their text in a string and have a single scope. Callbacks given
+to set_timeout and set_timeout_async are queued, and run by run_pending.
+"""
+
+import tempfile
+
+HOVER_TEXT = 1
+INHIBIT_WORD_COMPLETIONS = 8
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+DRAW_SQUIGGLY_UNDERLINE = 2048
+
+_CACHE_PATH = tempfile.mkdtemp(prefix='citer-bench-')
+_PENDING = []
+_SETTINGS = {}
+_VIEWS = {}
+_STATUS = []
+
+
+def cache_path():
+    return _CACHE_PATH
+
+
+def status_message(message):
+    _STATUS.append(message)
+
+
+def error_message(message):
+    raise RuntimeError(message)
+
+
+def set_timeout(callback, delay=0):
+    _PENDING.append(callback)
+
+
+def set_timeout_async(callback, delay=0):
+    _PENDING.append(callback)
+
+
+def run_pending():
+    """Run the queued callbacks, and those they queue"""
+    while _PENDING:
+        _PENDING.pop(0)()
+
+
+class Region(object):
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def __repr__(self):
+        return 'Region(%d, %d)' % (self.a, self.b)
+
+
+class Settings(dict):
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.callbacks = {}
+
+    def set(self, key, value):
+        self[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+
+def load_settings(name):
+    if name not in _SETTINGS:
+        _SETTINGS[name] = Settings()
+    return _SETTINGS[name]
+
+
+class Selection(list):
+    pass
+
+
+class View(object):
+    _ids = 0
+
+    def __new__(cls, view_id=None, *args, **kwargs):
+        if view_id is not None and view_id in _VIEWS:
+            return _VIEWS[view_id]
+        return object.__new__(cls)
+
+    def __init__(self, view_id=None, text='', scope='text.html.markdown',
+                 file_name=None, window=None):
+        if view_id is not None and view_id in _VIEWS:
+            return
+        View._ids += 1
+        self.view_id = View._ids
+        _VIEWS[self.view_id] = self
+        self.text = text
+        self.scope = scope
+        self._file_name = file_name
+        self._window = window
+        self._settings = Settings()
+        self.changes = 0
+        self.selection = Selection([Region(0)])
+        self.regions = {}
+        self.status = {}
+        self.popups = 0
+        self.listeners = []  # TextChangeListener instances of the buffer
+
+    def id(self):
+        return self.view_id
+
+    def buffer_id(self):
+        return self.view_id
+
+    def is_valid(self):
+        return self.view_id in _VIEWS
+
+    def close(self):
+        _VIEWS.pop(self.view_id, None)
+
+    def window(self):
+        return self._window
+
+    def file_name(self):
+        return self._file_name
+
+    def settings(self):
+        return self._settings
+
+    def change_count(self):
+        return self.changes
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, region):
+        return self.text[region.begin():region.end()]
+
+    def line(self, region):
+        if not isinstance(region, Region):
+            region = Region(region)
+        begin = self.text.rfind('\n', 0, region.begin()) + 1
+        end = self.text.find('\n', region.end())
+        return Region(begin, len(self.text) if end < 0 else end)
+
+    def full_line(self, region):
+        line = self.line(region)
+        return Region(line.begin(), min(line.end() + 1, len(self.text)))
+
+    def sel(self):
+        return self.selection
+
+    def match_selector(self, point, selector):
+        return self.scope.startswith(selector)
+
+    def replace(self, edit, region, text):
+        begin, end = region.begin(), region.end()
+        self.text = self.text[:begin] + text + self.text[end:]
+        self.changes += 1
+        change = TextChange(begin, end, text)
+        for listener in self.listeners:
+            listener.on_text_changed([change])
+
+    def insert(self, edit, point, text):
+        self.replace(edit, Region(point), text)
+
+    def run_command(self, name, args=None):
+        if name == 'insert':
+            point = self.selection[0].begin()
+            self.insert(None, point, args['characters'])
+            self.selection = Selection([Region(point + len(args['characters']))])
+
+    def show_popup(self, content, **kwargs):
+        self.popups += 1
+
+    def add_regions(self, key, regions, *args, **kwargs):
+        self.regions[key] = regions
+
+    def erase_regions(self, key):
+        self.regions.pop(key, None)
+
+    def set_status(self, key, value):
+        self.status[key] = value
+
+    def erase_status(self, key):
+        self.status.pop(key, None)
+
+
+class HistoricPosition(object):
+    def __init__(self, pt):
+        self.pt = pt
+
+
+class TextChange(object):
+    def __init__(self, a, b, text):
+        self.a = HistoricPosition(a)
+        self.b = HistoricPosition(b)
+        self.str = text
+
+
+class Buffer(object):
+    def __init__(self, view):
+        self.view = view
+
+    def id(self):
+        return self.view.buffer_id()
+
+
+class Window(object):
+    def __init__(self, window_id=1, folders=None, project_data=None,
+                 project_file_name=None):
+        self.window_id = window_id
+        self._folders = folders or []
+        self._project_data = project_data
+        self._project_file_name = project_file_name
+        self.view = None
+        self.quick_panel_items = None
+        self.input_panel = None
+
+    def id(self):
+        return self.window_id
+
+    def folders(self):
+        return self._folders
+
+    def project_data(self):
+        return self._project_data
+
+    def project_file_name(self):
+        return self._project_file_name
+
+    def active_view(self):
+        return self.view
+
+    def show_quick_panel(self, items, on_select, *args, **kwargs):
+        self.quick_panel_items = items
+
+    def show_input_panel(self, caption, initial_text, on_done, on_change, on_cancel):
+        self.input_panel = (on_done, on_change, on_cancel)
+
+
+_WINDOW = Window()
+
+
+def active_window():
+    return _WINDOW
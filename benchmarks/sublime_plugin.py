@@ -0,0 +1,40 @@
+"""
+A minimal stand-in for Sublime Text's `sublime_plugin` module, see
+sublime.py.
+"""
+
+
+class EventListener(object):
+    pass
+
+
+class ViewEventListener(object):
+    def __init__(self, view):
+        self.view = view
+
+
+class TextChangeListener(object):
+    def __init__(self):
+        self.buffer = None
+
+    @classmethod
+    def is_applicable(cls, buffer):
+        return False
+
+    def attach(self, buffer):
+        self.buffer = buffer
+        buffer.view.listeners.append(self)
+
+
+class TextCommand(object):
+    def __init__(self, view):
+        self.view = view
+
+
+class WindowCommand(object):
+    def __init__(self, window):
+        self.window = window
+
+
+class ApplicationCommand(object):
+    pass
@@ -3,7 +3,8 @@ Bibtexparser Module
 
 Parser for bibtex files.
 """
-__all__ = ['bparser', 'bwrite', 'info', 'latexenc', 'customization']
+__all__ = ['bparser', 'bwrite', 'info', 'latexenc', 'customization',
+           'snapshot']
 __version__ = '0.5.5'
 
-from . import bparser, bwriter, info, latexenc, customization
+from . import bparser, bwriter, info, latexenc, customization, snapshot
@@ -0,0 +1,5 @@
+import sys
+
+from bibtexparser.cli import main
+
+sys.exit(main())
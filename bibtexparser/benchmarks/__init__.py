@@ -0,0 +1,11 @@
+"""
+Benchmarks for bibtexparser.
+
+:mod:`bibtexparser.benchmarks.corpus` generates synthetic bibtex files and
+:mod:`bibtexparser.benchmarks.run` measures the parser, customizations and
+writers on them. Run them with::
+
+    python -m bibtexparser.benchmarks --entries 1000 10000 --output results.json
+    python -m bibtexparser.benchmarks --entries 1000 10000 --compare results.json
+"""
+__all__ = ['corpus', 'run']
@@ -0,0 +1,5 @@
+import sys
+
+from bibtexparser.benchmarks.run import main
+
+sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic generator of synthetic bibtex corpora.
+
+The same arguments always produce the same file, so that timings of
+different runs are comparable. Entries are written in the style of the
+reference managers most bibtex files come from:
+
+* zotero: lowercase types, tab indented, ``urldate`` and ``file`` fields
+* mendeley: fields in alphabetical order, ``mendeley-groups``, no indent
+* jabref: capitalized types, ``owner`` and ``timestamp`` fields and a
+  trailing ``@Comment{jabref-meta: ...}``
+
+Example:
+
+>>> from bibtexparser.benchmarks.corpus import generate_corpus
+>>> bibtex = generate_corpus(1000, style='jabref', seed=1)
+
+"""
+
+from __future__ import unicode_literals
+
+import random
+
+__all__ = ['STYLES', 'generate_corpus', 'write_corpus']
+
+STYLES = ('zotero', 'mendeley', 'jabref')
+
+_SURNAMES = ['Smith', 'Nguyen', 'Garcia', 'Müller', 'Rossi', 'Kowalski',
+             'Tanaka', 'Dubois', 'Ivanov', 'Andersson', 'Okafor', 'Silva',
+             'Cohen', 'Novak', 'Haddad', 'Larsen', 'Fischer', 'Moreau']
+_GIVEN_NAMES = ['Anna', 'John', 'Wei', 'Maria', 'Pierre', 'Aiko', 'Olga',
+                'Lars', 'Chidi', 'Ana', 'David', 'Eva', 'Karim', 'Ingrid']
+_WORDS = ['quantum', 'network', 'model', 'theory', 'dynamics', 'learning',
+          'graph', 'protein', 'structure', 'analysis', 'stochastic', 'field',
+          'optimal', 'control', 'spectral', 'method', 'inference', 'neural',
+          'evolution', 'transport', 'symmetry', 'kernel', 'entropy', 'flow']
+# latex accents, as written by the reference managers
+_ACCENTS = ["{\\'e}", '{\\`e}', '{\\"u}', '\\"{o}', '{\\c c}', '{\\~n}',
+            '{\\aa}', '{\\o}', '{\\ss}']
+# @string macros and the journal they stand for
+_JOURNALS = [('prl', 'Physical Review Letters'),
+             ('jcp', 'Journal of Chemical Physics'),
+             ('nat', 'Nature'),
+             ('pnas', 'Proceedings of the National Academy of Sciences'),
+             ('jmlr', 'Journal of Machine Learning Research')]
+_TYPES = ['article', 'article', 'article', 'inproceedings', 'book',
+          'phdthesis', 'techreport']
+
+
+class _Generator(object):
+
+    def __init__(self, style, accents, strings, abstracts, seed):
+        if style not in STYLES:
+            raise ValueError('Unknown style %s, expected one of %s'
+                             % (style, ', '.join(STYLES)))
+        self.style = style
+        self.accents = accents
+        self.strings = strings
+        self.abstracts = abstracts
+        self.random = random.Random(seed)
+        self.citekeys = set()
+
+    def text(self, words):
+        text = ' '.join(self.random.choice(_WORDS) for _ in range(words))
+        if self.random.random() < self.accents:
+            # swap a letter for an accented one, in latex
+            latex = self.random.choice(_ACCENTS)
+            position = self.random.randrange(len(text))
+            if text[position] != ' ':
+                text = text[:position] + latex + text[position + 1:]
+        return text
+
+    def surname(self):
+        surname = self.random.choice(_SURNAMES)
+        if surname == 'Müller':
+            surname = 'M{\\"u}ller' if self.random.random() < self.accents else 'Muller'
+        return surname
+
+    def citekey(self, surname, year, title):
+        def plain(text):
+            return ''.join(char for char in text if char.isalpha())
+
+        if self.style == 'zotero':
+            base = '%s_%s_%d' % (plain(surname).lower(), plain(title.split(' ')[0]).lower(), year)
+        else:
+            base = '%s%d' % (plain(surname), year)
+        citekey = base
+        suffix = 0
+        while citekey in self.citekeys:
+            suffix += 1
+            citekey = base + (chr(ord('a') + suffix - 1) if suffix <= 26 else str(suffix))
+        self.citekeys.add(citekey)
+        return citekey
+
+    def abstract(self):
+        """A multi-line abstract, as long as real ones"""
+        sentences = [self.text(self.random.randint(8, 20)).capitalize() + '.'
+                     for _ in range(self.random.randint(3, 8))]
+        lines = []
+        line = ''
+        for word in ' '.join(sentences).split(' '):
+            if len(line) + len(word) > 70:
+                lines.append(line)
+                line = word
+            else:
+                line = (line + ' ' + word).strip()
+        lines.append(line)
+        return '\n'.join(lines)
+
+    def entry(self, number):
+        rand = self.random
+        bibtype = rand.choice(_TYPES)
+        year = rand.randint(1950, 2024)
+        surnames = [self.surname() for _ in range(rand.randint(1, 5))]
+        authors = ' and '.join('%s, %s' % (surname, rand.choice(_GIVEN_NAMES))
+                               for surname in surnames)
+        title = self.text(rand.randint(4, 12)).capitalize()
+        citekey = self.citekey(surnames[0], year, title)
+
+        fields = [('author', '{%s}' % authors), ('title', '{%s}' % title),
+                  ('year', '{%d}' % year)]
+        if bibtype == 'article':
+            macro, journal = rand.choice(_JOURNALS)
+            fields.append(('journal', macro if self.strings else '{%s}' % journal))
+            fields.append(('volume', '{%d}' % rand.randint(1, 120)))
+            fields.append(('pages', '{%d--%d}' % (number, number + rand.randint(1, 30))))
+        elif bibtype == 'inproceedings':
+            fields.append(('booktitle', '{Proceedings of the %s}' % self.text(3).title()))
+        elif bibtype == 'book':
+            fields.append(('publisher', '{%s Press}' % rand.choice(_SURNAMES)))
+        else:
+            fields.append(('school' if bibtype == 'phdthesis' else 'institution',
+                           '{University of %s}' % rand.choice(_SURNAMES)))
+        fields.append(('doi', '{10.%d/%s.%d}' % (rand.randint(1000, 9999), citekey.lower(), number)))
+        if rand.random() < self.abstracts:
+            fields.append(('abstract', '{%s}' % self.abstract()))
+        fields.append(('keywords', '{%s}' % ', '.join(self.text(1) for _ in range(3))))
+
+        if self.style == 'zotero':
+            fields.append(('urldate', '{%d-%02d-%02d}' % (rand.randint(2010, 2024),
+                                                        rand.randint(1, 12), rand.randint(1, 28))))
+            fields.append(('file', '{Full Text PDF:files/%d/%s.pdf:application/pdf}' % (number, citekey)))
+            return self.format('@%s{%s,\n' % (bibtype, citekey), fields, '\t', ' = ')
+        elif self.style == 'mendeley':
+            fields.append(('mendeley-groups', '{%s}' % self.text(1)))
+            fields.sort()
+            return self.format('@%s{%s,\n' % (bibtype, citekey), fields, '', ' = ')
+        else:
+            fields.append(('owner', '{%s}' % rand.choice(_GIVEN_NAMES).lower()))
+            fields.append(('timestamp', '{%d.%02d.%02d}' % (rand.randint(2010, 2024),
+                                                           rand.randint(1, 12), rand.randint(1, 28))))
+            return self.format('@%s{%s,\n' % (bibtype.capitalize(), citekey), fields, '  ', ' = ')
+
+    @staticmethod
+    def format(head, fields, indent, equals):
+        lines = [indent + name + equals + value for name, value in fields]
+        return head + ',\n'.join(lines) + '\n}\n'
+
+    def corpus(self, entries):
+        parts = []
+        if self.strings:
+            parts.append(''.join('@string{%s = "%s"}\n' % journal for journal in _JOURNALS))
+        parts += [self.entry(number) for number in range(entries)]
+        if self.style == 'jabref':
+            parts.append('@Comment{jabref-meta: databaseType:bibtex;}\n')
+        return '\n'.join(parts)
+
+
+def generate_corpus(entries, style='zotero', accents=0.2, strings=True,
+                    abstracts=0.5, seed=0):
+    """
+    Generate a synthetic bibtex file.
+
+    :param entries: number of entries
+    :param style: 'zotero', 'mendeley' or 'jabref'
+    :param accents: probability for a title, abstract sentence or name to
+    contain a latex accent
+    :param strings: if true, journals are @string macros
+    :param abstracts: probability for an entry to have a multi-line abstract
+    :param seed: seed of the random generator
+    :returns: string -- bibtex
+    :raises: ValueError if the style is unknown
+    """
+    return _Generator(style, accents, strings, abstracts, seed).corpus(entries)
+
+
+def write_corpus(filename, entries, **kwargs):
+    """
+    Write a synthetic bibtex file, see :func:`generate_corpus` for the
+    arguments.
+    """
+    with open(filename, 'wb') as bibfile:
+        bibfile.write(generate_corpus(entries, **kwargs).encode('utf-8'))
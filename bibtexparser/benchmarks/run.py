@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the throughput and peak memory of the parser, the customizations
+and the writers on synthetic corpora (see
+:mod:`bibtexparser.benchmarks.corpus`).
+
+Results are a json document, so that runs can be saved and compared:
+
+>>> from bibtexparser.benchmarks.run import run_benchmarks, compare
+>>> old = run_benchmarks([1000])
+>>> new = run_benchmarks([1000])
+>>> for line in compare(old, new):
+...     print(line)
+
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python < 3.4
+    tracemalloc = None
+
+from bibtexparser import __version__
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.bwriter import to_bibtex, to_json
+from bibtexparser.customization import convert_to_unicode, homogeneize_latex_encoding
+from bibtexparser.benchmarks.corpus import STYLES, generate_corpus
+
+__all__ = ['BENCHMARKS', 'run_benchmarks', 'format_result', 'compare',
+           'slowdowns', 'main']
+
+RESULTS_VERSION = 1
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _parse(data):
+    return BibTexParser(data, ignore_nonstandard_types=False)
+
+
+def _records(data):
+    return _parse(data).get_entry_list()
+
+
+# (name, (setup, benchmark)): setup is called with the corpus and is not
+# measured, benchmark is timed on what setup returned
+BENCHMARKS = [
+    ('parse', (lambda data: data, _parse)),
+    ('convert_to_unicode', (_records, lambda records: [convert_to_unicode(dict(record))
+                                                       for record in records])),
+    ('homogeneize_latex_encoding', (_records, lambda records: [homogeneize_latex_encoding(dict(record))
+                                                               for record in records])),
+    ('to_bibtex', (_parse, to_bibtex)),
+    ('to_json', (_parse, to_json)),
+]
+
+
+def _time(function, argument, repeat):
+    """Best time of repeat calls"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = _clock()
+        function(argument)
+        elapsed = _clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(function, argument):
+    """Peak of the memory allocated by a call, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(sizes, names=None, repeat=3, memory=True, style='zotero',
+                   accents=0.2, strings=True, abstracts=0.5, seed=0, report=None):
+    """
+    Run the benchmarks on corpora of each size.
+
+    :param sizes: list of numbers of entries
+    :param names: benchmarks to run, all by default
+    :param repeat: each timing is the best of this many runs
+    :param memory: if true (and tracemalloc is available), measure the peak
+    memory of each benchmark in an additional, untimed, run
+    :param report: a function called with each result as it is measured
+    :returns: dict -- results, json serialisable
+    :raises: ValueError if a benchmark name is unknown
+    """
+    benchmarks = dict(BENCHMARKS)
+    names = names or [name for name, _ in BENCHMARKS]
+    for name in names:
+        if name not in benchmarks:
+            raise ValueError('Unknown benchmark %s' % name)
+    corpus = {'style': style, 'accents': accents, 'strings': strings,
+              'abstracts': abstracts, 'seed': seed}
+    results = []
+    for size in sizes:
+        data = generate_corpus(size, **corpus)
+        megabytes = len(data.encode('utf-8')) / 1e6
+        for name in names:
+            setup, benchmark = benchmarks[name]
+            argument = setup(data)
+            seconds = _time(benchmark, argument, repeat)
+            result = {
+                'benchmark': name,
+                'entries': size,
+                'megabytes': round(megabytes, 3),
+                'seconds': seconds,
+                'entries_per_second': size / seconds if seconds else None,
+                'megabytes_per_second': megabytes / seconds if seconds else None,
+                'peak_memory': None,
+            }
+            if memory and tracemalloc is not None:
+                result['peak_memory'] = _peak_memory(benchmark, argument)
+            results.append(result)
+            if report is not None:
+                report(result)
+    return {
+        'version': RESULTS_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'bibtexparser': __version__,
+        },
+        'corpus': corpus,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def format_result(result):
+    memory = result['peak_memory']
+    return '%-28s %8d entries %9.3f s %10.0f entries/s %7.2f MB/s %s' % (
+        result['benchmark'], result['entries'], result['seconds'],
+        result['entries_per_second'] or 0, result['megabytes_per_second'] or 0,
+        '' if memory is None else '%9.1f MB peak' % (memory / 1e6))
+
+
+def compare(old, new):
+    """
+    Compare two results of :func:`run_benchmarks`, benchmark by benchmark.
+
+    :returns: list -- lines of the comparison, with the ratio of the new
+    time (and peak memory) to the old one
+    """
+    previous = dict(((result['benchmark'], result['entries']), result)
+                    for result in old['results'])
+    lines = []
+    if old.get('corpus') != new.get('corpus'):
+        lines.append('warning: the corpora differ, %r and %r'
+                     % (old.get('corpus'), new.get('corpus')))
+    for result in new['results']:
+        before = previous.get((result['benchmark'], result['entries']))
+        if before is None:
+            continue
+        line = '%-28s %8d entries  time x%.2f' % (
+            result['benchmark'], result['entries'],
+            result['seconds'] / before['seconds'] if before['seconds'] else float('nan'))
+        if result['peak_memory'] and before['peak_memory']:
+            line += '  memory x%.2f' % (result['peak_memory'] / float(before['peak_memory']))
+        lines.append(line)
+    return lines
+
+
+def slowdowns(old, new, threshold):
+    """Benchmarks of new taking more than threshold times as long as in old"""
+    previous = dict(((result['benchmark'], result['entries']), result['seconds'])
+                    for result in old['results'])
+    return [result for result in new['results']
+            if previous.get((result['benchmark'], result['entries'])) and
+            result['seconds'] > threshold * previous[(result['benchmark'], result['entries'])]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m bibtexparser.benchmarks',
+        description='Benchmark bibtexparser on synthetic corpora.')
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 10000],
+                        help='corpus sizes, in entries (default: 1000 10000)')
+    parser.add_argument('--benchmark', action='append', dest='names',
+                        choices=[name for name, _ in BENCHMARKS],
+                        help='benchmark to run, can be repeated (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='keep the best of this many runs (default: 3)')
+    parser.add_argument('--no-memory', action='store_false', dest='memory',
+                        help='do not measure peak memory')
+    parser.add_argument('--style', choices=STYLES, default='zotero')
+    parser.add_argument('--accents', type=float, default=0.2,
+                        help='probability of latex accents in a text')
+    parser.add_argument('--no-strings', action='store_false', dest='strings',
+                        help='do not use @string macros')
+    parser.add_argument('--abstracts', type=float, default=0.5,
+                        help='probability for an entry to have an abstract')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help='compare with the results of a previous run')
+    parser.add_argument('--fail-above', type=float, metavar='RATIO',
+                        help='with --compare, exit with an error if a benchmark '
+                             'takes more than RATIO times as long as before')
+    args = parser.parse_args(argv)
+
+    def report(result):
+        print(format_result(result))
+        sys.stdout.flush()
+
+    results = run_benchmarks(args.entries, names=args.names, repeat=args.repeat,
+                             memory=args.memory, style=args.style, accents=args.accents,
+                             strings=args.strings, abstracts=args.abstracts,
+                             seed=args.seed, report=report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as previous:
+            old = json.load(previous)
+        print('')
+        for line in compare(old, results):
+            print(line)
+        if args.fail_above and slowdowns(old, results, args.fail_above):
+            return 1
+    return 0
@@ -11,6 +11,7 @@ import sys
 import logging
 import io
 import re
+import copy
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,30 @@ else:
     ustr = unicode
 
 
+def _entry_length(record):
+    """
+    Length of the entry at the start of a record, up to its closing brace
+    (or parenthesis) and the end of that line if nothing else follows.
+
+    :param record: source of the record, from its @
+    :returns: int -- the length, the whole record if the entry is not closed
+    """
+    opening = re.search(r'[{(]', record)
+    if opening is None:
+        return len(record)
+    braces = 0
+    for position in range(opening.end(), len(record)):
+        char = record[position]
+        if char == '{':
+            braces += 1
+        elif char == '}' and braces > 0:
+            braces -= 1
+        elif braces == 0 and char == ('}' if opening.group() == '{' else ')'):
+            rest = re.match(r'[ \t]*(\r?\n|$)', record[position + 1:])
+            return position + 1 + (rest.end() if rest else 0)
+    return len(record)
+
+
 class BibTexParser(object):
     """
     A parser for bibtex files.
@@ -36,6 +61,9 @@ class BibTexParser(object):
     :param customization: a function to modify fields
     :param ignore_nonstandard_types: If true, do not check the validity of
     entries types (article, book...)
+    :param track_spans: If true, remember where each entry was found in data
+    so that the file can later be patched in place (see
+    :func:`bibtexparser.bwriter.to_bibtex_patched`)
 
     Example:
 
@@ -47,7 +75,7 @@ class BibTexParser(object):
 
     """
     def __init__(self, data, customization=None,
-                 ignore_nonstandard_types=True):
+                 ignore_nonstandard_types=True, track_spans=False):
         if type(data) is io.TextIOWrapper:
             logger.critical("The API has changed. You should pass data instead \
                              of a filehandler.")
@@ -64,6 +92,14 @@ class BibTexParser(object):
         if data[:3] == byte:
             data = data[3:]
         self.fileobj = StringIO(data)
+        # source text and (entry, start, end, pristine copy, source names)
+        # for each entry, only kept when track_spans is set. The source
+        # names are (key, name as written) pairs in source order, for the
+        # type and the fields, whose keys are lowercased and renamed (see
+        # alt_dict) in entries
+        self.source = data if track_spans else None
+        self.spans = [] if track_spans else None
+        self._names = []
 
         # set which bibjson schema this parser parses to
         self.has_metadata = False
@@ -108,13 +144,23 @@ class BibTexParser(object):
                 self.entries_hash[entry['id']] = entry
         return self.entries_hash
 
+    def get_entry_spans(self):
+        """Get the position of each entry in the source data.
+        Only available if the parser was created with track_spans.
+
+        :returns: list -- (entry, start, end) tuples, in source order
+        """
+        if self.spans is None:
+            return None
+        return [span[:3] for span in self.spans]
+
     def _parse_records(self, customization=None):
         """Parse the bibtex into a list of records.
 
         :param customization: a function
         :returns: list -- records
         """
-        def _add_parsed_record(record, records):
+        def _add_parsed_record(record, records, start, end):
             """
             Atomic function to parse a record
             and append the result in records
@@ -125,6 +171,10 @@ class BibTexParser(object):
                 if parsed:
                     logger.debug('Store the result of the parsed record')
                     records.append(parsed)
+                    if self.spans is not None:
+                        end = start + _entry_length(self.source[start:end])
+                        self.spans.append((parsed, start, end, copy.deepcopy(parsed),
+                                           self._names))
                 else:
                     logger.debug('Nothing returned from the parsed record!')
             else:
@@ -132,20 +182,27 @@ class BibTexParser(object):
 
         records = []
         record = ""
+        # offsets in the source: start of the current record and end of its
+        # last non-empty line, the span of an entry being narrowed down to
+        # its closing brace so that any comment after it is kept
+        offset = start = end = 0
         # read each line, bundle them up until they form an object, then send for parsing
         for linenumber, line in enumerate(self.fileobj):
             logger.debug('Inspect line %s', linenumber)
             if line.strip().startswith('@'):
                 logger.debug('Line starts with @')
-                _add_parsed_record(record, records)
+                _add_parsed_record(record, records, start, end)
                 logger.debug('The record is set to empty')
                 record = ""
+                start = offset
+            offset += len(line)
             if len(line.strip()) > 0:
                 logger.debug('The line is not empty, add it to record')
                 record += line
+                end = offset
 
         # catch any remaining record and send it for parsing
-        _add_parsed_record(record, records)
+        _add_parsed_record(record, records, start, end)
         logger.debug('Return the result')
         return records
 
@@ -162,6 +219,8 @@ class BibTexParser(object):
         :returns: dict --
         """
         d = {}
+        # filled as keys are read, see self.spans
+        names = self._names = []
 
         if not record.startswith('@'):
             logger.debug('The record does not start with @. Return empty dict.')
@@ -215,6 +274,7 @@ class BibTexParser(object):
                 # it is the start of the record - set the bibtype and citekey (id)
                 logger.debug('Line starts with @ and the key is not stored yet.')
                 bibtype, id = kv.split('{', 1)
+                names.append(('type', bibtype.strip().strip('@')))
                 bibtype = self._add_key(bibtype)
                 id = id.strip('}').strip(',')
                 logger.debug('bibtype = %s', bibtype)
@@ -239,7 +299,8 @@ class BibTexParser(object):
                 # it is a line with a key value pair on it
                 logger.debug('Line contains a key-pair value and the key is not stored yet.')
                 key, val = [i.strip() for i in kv.split('=', 1)]
-                key = self._add_key(key)
+                name, key = key, self._add_key(key)
+                names.append((key, name))
                 val = self._string_subst_partial(val)
                 # if it looks like the value spans lines, store details for next loop
                 if (val.count('{') != val.count('}')) or (val.startswith('"') and not val.replace('}', '').endswith('"')):
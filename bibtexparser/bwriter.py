@@ -3,12 +3,45 @@
 # Author: Francois Boulogne
 # License:
 
+import io
 import json
 import logging
+import os
+import tempfile
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['to_bibtex', 'to_json']
+__all__ = ['to_bibtex', 'to_bibtex_patched', 'write_bibtex', 'to_json']
+
+
+def _entry_to_bibtex(entry, names=()):
+    """
+    Convert a single entry to a bibtex string.
+
+    :param entry: an entry dict
+    :param names: (key, name) pairs of the type and fields as written in the
+    source, in source order: those fields are written first, under these
+    names, and the others after them, sorted
+    :returns: string -- bibtex
+    :raises: TypeError if a field is not a string
+    """
+    source = {}
+    fields = []
+    for key, name in names:
+        if key in entry and key not in source:
+            fields.append(key)
+        source[key] = name
+    fields += sorted(i for i in entry if i not in source)
+    bibtex = '@' + source.get('type', entry['type']) + '{' + entry['id'] + ",\n"
+
+    for field in [i for i in fields if i not in ['type', 'id']]:
+        try:
+            bibtex += " " + source.get(field, field) + " = {" + entry[field] + "},\n"
+        except TypeError:
+            raise TypeError("The field %s in entry %s must be a string"
+                            % (field, entry['id']))
+    bibtex += "}\n"
+    return bibtex
 
 
 def to_bibtex(parsed):
@@ -24,18 +57,97 @@ def to_bibtex(parsed):
     data = parsed.get_entry_dict()
     bibtex = ''
     for entry in sorted(data.keys()):
-        bibtex += '@' + data[entry]['type'] + '{' + data[entry]['id'] + ",\n"
-
-        for field in [i for i in sorted(data[entry]) if i not in ['type', 'id']]:
-            try:
-                bibtex += " " + field + " = {" + data[entry][field] + "},\n"
-            except TypeError:
-                raise TypeError("The field %s in entry %s must be a string"
-                                % (field, entry))
-        bibtex += "}\n\n"
+        bibtex += _entry_to_bibtex(data[entry]) + "\n"
     return bibtex
 
 
+def to_bibtex_patched(parsed):
+    """
+    Convert parsed data to a bibtex string, keeping the original source.
+    Entries that were not modified since parsing, and everything between
+    entries (comments, @string...), are copied verbatim. Modified entries
+    are rewritten in place, under the type and field names of the source,
+    removed entries are dropped and new entries are appended at the end.
+
+    :param parsed: BibTexParser object created with track_spans=True
+    :returns: string -- bibtex
+    :raises: ValueError if the parser did not track spans
+    :raises: TypeError if a field of a modified entry is not a string
+    """
+    if parsed.spans is None:
+        raise ValueError("The parser must be created with track_spans=True")
+
+    source = parsed.source
+    current = parsed.get_entry_list()
+    alive = set(id(entry) for entry in current)
+    known = set()
+    chunks = []
+    position = 0
+    for entry, start, end, pristine, names in parsed.spans:
+        known.add(id(entry))
+        chunks.append(source[position:start])
+        if id(entry) not in alive:
+            logger.debug('Entry %s removed', pristine.get('id'))
+        elif entry == pristine:
+            chunks.append(source[start:end])
+        else:
+            logger.debug('Entry %s modified, rewrite it', entry.get('id'))
+            chunks.append(_entry_to_bibtex(entry, names))
+        position = end
+    chunks.append(source[position:])
+
+    bibtex = ''.join(chunks)
+    for entry in current:
+        if id(entry) not in known:
+            logger.debug('Entry %s added, append it', entry.get('id'))
+            if bibtex and not bibtex.endswith('\n'):
+                bibtex += '\n'
+            if bibtex:
+                bibtex += '\n'
+            bibtex += _entry_to_bibtex(entry)
+    return bibtex
+
+
+def write_bibtex(parsed, filename):
+    """
+    Write parsed data to a file, atomically.
+    If the parser tracked spans, the file is patched in place (see
+    :func:`to_bibtex_patched`), otherwise it is fully rewritten with
+    :func:`to_bibtex`. The data is written to a temporary file in the same
+    directory which then replaces filename, so readers never see a
+    partially written file.
+
+    :param parsed: BibTexParser object
+    :param filename: path of the file to write
+    """
+    if parsed.spans is not None:
+        bibtex = to_bibtex_patched(parsed)
+    else:
+        bibtex = to_bibtex(parsed)
+    _write_atomic(filename, bibtex.encode('utf-8'))
+
+
+def _write_atomic(filename, data):
+    """
+    Write bytes to a temporary file next to filename, then rename it over
+    filename, keeping the permissions of the file it replaces.
+
+    :param filename: path of the file to write
+    :param data: bytes
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(prefix='.bibtex-', suffix='.tmp', dir=folder)
+    try:
+        with io.open(fd, 'wb') as tmpfile:
+            tmpfile.write(data)
+        if os.path.exists(filename):
+            os.chmod(tmpname, os.stat(filename).st_mode & 0o7777)
+        os.replace(tmpname, filename)
+    except Exception:
+        os.remove(tmpname)
+        raise
+
+
 def to_json(parsed):
     """
     Convert parsed data to json. This function is EXPERIMENTAL.
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line batch tool, run as ``python -m bibtexparser``.
+
+Each subcommand processes any number of files on a pool of worker
+processes. Results are printed in the order of the files as soon as they
+are ready, each with a summary of its entries per second and peak memory
+(on stderr, so that converted files can be piped).
+
+    python -m bibtexparser validate *.bib
+    python -m bibtexparser convert unicode --output-dir clean/ *.bib
+    python -m bibtexparser convert latex --in-place library.bib
+    python -m bibtexparser export json --output-dir json/ *.bib
+    python -m bibtexparser bench --entries 1000 10000
+
+``convert`` only rewrites the entries the conversion changes, under their
+original field names, keeping the rest of each file (comments, ``@string``
+definitions, order and layout) as it was.
+
+``bench`` takes the arguments of :mod:`bibtexparser.benchmarks.run`.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python < 3.4
+    tracemalloc = None
+
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.bwriter import to_bibtex, to_bibtex_patched, to_json, write_bibtex, _write_atomic
+from bibtexparser.customization import convert_to_unicode, homogeneize_latex_encoding
+
+__all__ = ['process_file', 'validate', 'format_summary', 'main']
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+CONVERSIONS = {
+    'unicode': convert_to_unicode,
+    'latex': homogeneize_latex_encoding,
+}
+EXPORTS = {
+    'bibtex': ('.bib', to_bibtex),
+    'json': ('.json', to_json),
+}
+
+# lines starting a record that is not an entry
+_RECORD = re.compile(r'^\s*@', re.MULTILINE)
+_NOT_ENTRY = re.compile(r'^\s*@\s*(string|comment|preamble)\b', re.MULTILINE | re.IGNORECASE)
+
+
+def validate(data, parser):
+    """
+    Check a parsed file for the problems that silently lose entries.
+
+    :param data: the bibtex string that was parsed
+    :param parser: its BibTexParser
+    :returns: list -- descriptions of the problems found
+    """
+    problems = []
+    entries = parser.get_entry_list()
+    records = len(_RECORD.findall(data)) - len(_NOT_ENTRY.findall(data))
+    if records > len(entries):
+        problems.append('%d records could not be parsed' % (records - len(entries)))
+    seen = set()
+    for entry in entries:
+        citekey = entry.get('id')
+        if citekey in seen:
+            problems.append('duplicate citekey %s' % citekey)
+        seen.add(citekey)
+        if 'title' not in entry:
+            problems.append('%s has no title' % citekey)
+    return problems
+
+
+def process_file(task):
+    """
+    Run a subcommand on a file.
+
+    :param task: tuple -- (command, path, options), options being a dict of
+    the command's arguments: conversion, format, output_dir, in_place and
+    memory
+    :returns: dict -- path, entries, seconds, peak_memory (bytes, or None),
+    problems, output (the converted text, if not written to a file) and
+    error (or None)
+    """
+    command, path, options = task
+    result = {'path': path, 'entries': 0, 'seconds': 0.0, 'peak_memory': None,
+              'problems': [], 'output': None, 'error': None}
+    try:
+        with io.open(path, 'r', encoding='utf-8') as bibfile:
+            data = bibfile.read()
+    except (IOError, OSError, UnicodeDecodeError) as e:
+        result['error'] = str(e)
+        return result
+
+    memory = options.get('memory') and tracemalloc is not None
+    if memory:
+        tracemalloc.start()
+    start = _clock()
+    try:
+        if command == 'convert':
+            # converted after parsing, so that the entries the conversion
+            # does not change are patched back verbatim
+            parser = BibTexParser(data, ignore_nonstandard_types=False, track_spans=True)
+            conversion = CONVERSIONS[options['conversion']]
+            for entry in parser.get_entry_list():
+                converted = conversion(dict(entry))
+                entry.clear()
+                entry.update(converted)
+        else:
+            parser = BibTexParser(data, ignore_nonstandard_types=False)
+        if command == 'validate':
+            result['problems'] = validate(data, parser)
+        elif options.get('in_place'):
+            write_bibtex(parser, path)
+        else:
+            extension, writer = EXPORTS[options.get('format', 'bibtex')]
+            if command == 'convert':
+                writer = to_bibtex_patched
+            output = writer(parser)
+            if options.get('output_dir'):
+                name = os.path.splitext(os.path.basename(path))[0] + extension
+                _write_atomic(os.path.join(options['output_dir'], name), output.encode('utf-8'))
+            else:
+                result['output'] = output
+        result['entries'] = len(parser.get_entry_list())
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        result['seconds'] = _clock() - start
+        if memory:
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result
+
+
+def format_summary(result):
+    if result['error'] is not None:
+        return '%s: error: %s' % (result['path'], result['error'])
+    memory = result['peak_memory']
+    return '%s: %d entries, %.3f s, %.0f entries/s%s' % (
+        result['path'], result['entries'], result['seconds'],
+        result['entries'] / result['seconds'] if result['seconds'] else 0,
+        '' if memory is None else ', %.1f MB peak' % (memory / 1e6))
+
+
+def _results(tasks, jobs):
+    """Results of the tasks in order, each as soon as it and those before it are done"""
+    if jobs == 1 or len(tasks) == 1:
+        for task in tasks:
+            yield process_file(task)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap(process_file, tasks):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _run(command, args, options, out=None, err=None):
+    out = out or sys.stdout
+    err = err or sys.stderr
+    if options.get('output_dir') and not os.path.isdir(options['output_dir']):
+        os.makedirs(options['output_dir'])
+    tasks = [(command, path, options) for path in args.files]
+    failed = False
+    entries = 0
+    start = _clock()
+    for result in _results(tasks, args.jobs):
+        for problem in result['problems']:
+            out.write('%s: %s\n' % (result['path'], problem))
+        if result['output'] is not None:
+            out.write(result['output'])
+        out.flush()
+        failed = failed or result['error'] is not None or bool(result['problems'])
+        entries += result['entries']
+        if not args.quiet:
+            err.write(format_summary(result) + '\n')
+            err.flush()
+    if not args.quiet:
+        seconds = _clock() - start
+        err.write('total: %d files, %d entries in %.3f s, %.0f entries/s\n' % (
+            len(tasks), entries, seconds, entries / seconds if seconds else 0))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m bibtexparser',
+        description='Validate, convert and export bibtex files in batch.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    def add_files(subparser):
+        subparser.add_argument('files', nargs='+', help='bibtex files, in utf-8')
+        subparser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                               help='worker processes (default: the number of cpus)')
+        subparser.add_argument('--no-memory', action='store_false', dest='memory',
+                               help='do not measure peak memory, which slows processing')
+        subparser.add_argument('-q', '--quiet', action='store_true',
+                               help='do not print the summary')
+
+    def add_output(subparser):
+        output = subparser.add_mutually_exclusive_group()
+        output.add_argument('-o', '--output-dir',
+                            help='write each file to this folder instead of stdout')
+        output.add_argument('--in-place', action='store_true',
+                            help='overwrite each file')
+
+    validate_parser = subparsers.add_parser(
+        'validate', help='parse files and report unparsable records, '
+                         'duplicate citekeys and entries without title')
+    add_files(validate_parser)
+
+    convert = subparsers.add_parser('convert', help='convert the special characters '
+                                                    'of files to unicode or latex')
+    convert.add_argument('conversion', choices=sorted(CONVERSIONS))
+    add_output(convert)
+    add_files(convert)
+
+    export = subparsers.add_parser('export', help='export files to bibtex or json')
+    export.add_argument('format', choices=sorted(EXPORTS))
+    export.add_argument('-o', '--output-dir',
+                        help='write each file to this folder instead of stdout')
+    add_files(export)
+
+    subparsers.add_parser('bench', add_help=False,
+                          help='run the benchmarks, see python -m bibtexparser.benchmarks')
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        from bibtexparser.benchmarks.run import main as bench
+        return bench(rest)
+    if rest:
+        parser.error('unrecognized arguments: %s' % ' '.join(rest))
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    options = {'memory': args.memory}
+    if args.command == 'convert':
+        options.update(conversion=args.conversion, output_dir=args.output_dir,
+                       in_place=args.in_place)
+    elif args.command == 'export':
+        options.update(format=args.format, output_dir=args.output_dir)
+    return _run(args.command, args, options)
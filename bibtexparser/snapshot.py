@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Columnar on-disk snapshots of parsed entries.
+
+A snapshot stores a list of entries (as returned by
+BibTexParser.get_entry_list) so that it can be memory-mapped and read
+lazily: opening it only reads a small header, and looking up an entry or
+one of its fields only touches the bytes needed for it.
+
+Layout (all sections 8 byte aligned, arrays in the byte order of the
+machine that wrote the file, recorded in the header):
+
+* header: magic, byte order, counts and section positions
+* string offsets: n_strings + 1 uint64, offsets of each string in the blob
+* string blob: utf-8 encoded strings, deduplicated
+* field names: n_fields uint32 string ids
+* columns: for each field, n_entries uint32 string ids (MISSING if the
+  entry does not have the field)
+* citekeys: n_entries uint32 entry indices, sorted by citekey
+* meta: a json object, free for the caller to use
+
+Example:
+
+>>> from bibtexparser.snapshot import write_snapshot, Snapshot
+>>> write_snapshot(parser.get_entry_list(), 'library.snap')
+>>> with Snapshot('library.snap') as snapshot:
+...     title = snapshot['Cesar2013']['title']
+
+"""
+
+import sys
+import json
+import mmap
+import struct
+import logging
+from array import array
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from bibtexparser.bwriter import _write_atomic
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['write_snapshot', 'Snapshot', 'SnapshotEntry']
+
+MAGIC = b'BIBSNAP1'
+MISSING = 0xFFFFFFFF
+# magic, byte order, n_entries, n_fields, n_strings, then the position of
+# the offsets, blob, fields, columns, citekeys and meta sections and the
+# length of meta
+HEADER = struct.Struct('<8sBxxxIIIQQQQQQQ')
+
+
+def _pad(data):
+    """Pad a bytearray with zeros to a multiple of 8 bytes"""
+    data.extend(b'\0' * (-len(data) % 8))
+
+
+def write_snapshot(entries, filename, meta=None):
+    """
+    Write entries to a snapshot file, atomically.
+
+    :param entries: list of entries, all values must be strings
+    :param filename: path of the snapshot
+    :param meta: a json serialisable dict stored with the snapshot
+    :raises: TypeError if a field is not a string
+    """
+    strings = {}
+    blob = bytearray()
+    offsets = array('Q', [0])
+
+    def intern(value):
+        sid = strings.get(value)
+        if sid is None:
+            sid = strings[value] = len(offsets) - 1
+            blob.extend(value.encode('utf-8'))
+            offsets.append(len(blob))
+        return sid
+
+    fields = sorted(set(field for entry in entries for field in entry))
+    columns = dict((field, array('I', [MISSING]) * len(entries)) for field in fields)
+    for index, entry in enumerate(entries):
+        for field, value in entry.items():
+            if not isinstance(value, str):
+                raise TypeError("The field %s in entry %s must be a string"
+                                % (field, entry.get('id')))
+            columns[field][index] = intern(value)
+    field_ids = array('I', [intern(field) for field in fields])
+    citekeys = array('I', sorted(range(len(entries)),
+                                 key=lambda i: (entries[i].get('id', ''), i)))
+    meta = json.dumps(meta or {}).encode('utf-8')
+
+    data = bytearray(HEADER.size)
+    _pad(data)
+    positions = []
+    for section in ([offsets.tobytes(), bytes(blob), field_ids.tobytes()] +
+                    [b''.join(columns[field].tobytes() for field in fields)] +
+                    [citekeys.tobytes(), meta]):
+        positions.append(len(data))
+        data.extend(section)
+        _pad(data)
+    HEADER.pack_into(data, 0, MAGIC, ord(sys.byteorder[0]), len(entries),
+                     len(fields), len(offsets) - 1, *(positions + [len(meta)]))
+    _write_atomic(filename, bytes(data))
+
+
+class Snapshot(object):
+    """
+    A memory-mapped, read-only snapshot written by :func:`write_snapshot`.
+
+    Behaves like a mapping from citekeys to :class:`SnapshotEntry`. If
+    several entries share a citekey, the last one wins, as with
+    BibTexParser.get_entry_dict.
+
+    :param filename: path of the snapshot
+    :raises: ValueError if the file is not a valid snapshot
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as snapfile:
+            self._mmap = mmap.mmap(snapfile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _load_header(self):
+        if len(self._mmap) < HEADER.size:
+            raise ValueError('Truncated snapshot')
+        (magic, byteorder, self._size, n_fields, n_strings, offsets_pos,
+         self._blob_pos, fields_pos, columns_pos, citekeys_pos, meta_pos,
+         meta_len) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a bibtexparser snapshot')
+        if byteorder != ord(sys.byteorder[0]):
+            raise ValueError('Snapshot written with another byte order')
+
+        view = memoryview(self._mmap)
+        self._views = [view]
+        self._offsets = self._cast(view, offsets_pos, n_strings + 1, 'Q')
+        field_ids = self._cast(view, fields_pos, n_fields, 'I')
+        self.fields = [self._string(sid) for sid in field_ids]
+        self._columns = {}
+        for number, field in enumerate(self.fields):
+            position = columns_pos + 4 * self._size * number
+            self._columns[field] = self._cast(view, position, self._size, 'I')
+        self._citekeys = self._cast(view, citekeys_pos, self._size, 'I')
+        self._id_column = self._columns.get('id')
+        self.meta = json.loads(self._mmap[meta_pos:meta_pos + meta_len].decode('utf-8'))
+
+    def _cast(self, view, position, count, code):
+        size = struct.calcsize(code)
+        if position + size * count > len(self._mmap):
+            raise ValueError('Truncated snapshot')
+        cast = view[position:position + size * count].cast(code)
+        self._views.append(cast)
+        return cast
+
+    def _string(self, sid):
+        start = self._blob_pos + self._offsets[sid]
+        end = self._blob_pos + self._offsets[sid + 1]
+        return self._mmap[start:end].decode('utf-8')
+
+    def close(self):
+        """Release the memory map. Entries can not be read afterwards."""
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def mapped_size(self):
+        """Size of the memory-mapped file, in bytes"""
+        return len(self._mmap)
+
+    def field_sizes(self):
+        """Get the size of the values of each field, each distinct value
+        counted once per field.
+
+        :returns: dict -- field name -> bytes of utf-8 encoded values
+        """
+        offsets = self._offsets
+        sizes = {}
+        for field, column in self._columns.items():
+            sids = set(column)
+            sids.discard(MISSING)
+            sizes[field] = sum(offsets[sid + 1] - offsets[sid] for sid in sids)
+        return sizes
+
+    def value(self, index, field):
+        """Get a field of an entry, or None if the entry does not have it.
+
+        :param index: index of the entry, in the order it was written
+        :param field: field name
+        :returns: string -- value
+        """
+        column = self._columns.get(field)
+        if column is None:
+            return None
+        sid = column[index]
+        if sid == MISSING:
+            return None
+        return self._string(sid)
+
+    def citekey(self, index):
+        """Get the citekey of an entry, '' if it has none"""
+        if self._id_column is None or self._id_column[index] == MISSING:
+            return ''
+        return self._string(self._id_column[index])
+
+    def entry(self, index):
+        """Get an entry by position.
+
+        :returns: SnapshotEntry
+        """
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return SnapshotEntry(self, index)
+
+    def find(self, citekey):
+        """Binary search the sorted citekey column.
+
+        :returns: int -- index of the entry, or -1 if not found
+        """
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if citekey < self.citekey(self._citekeys[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo and self.citekey(self._citekeys[lo - 1]) == citekey:
+            return self._citekeys[lo - 1]
+        return -1
+
+    def keys(self):
+        """Iterate over the citekeys, in sorted order"""
+        previous = None
+        for index in self._citekeys:
+            citekey = self.citekey(index)
+            if citekey != previous:
+                yield citekey
+            previous = citekey
+
+    def __contains__(self, citekey):
+        return self.find(citekey) >= 0
+
+    def __getitem__(self, citekey):
+        index = self.find(citekey)
+        if index < 0:
+            raise KeyError(citekey)
+        return SnapshotEntry(self, index)
+
+    def get(self, citekey, default=None):
+        index = self.find(citekey)
+        if index < 0:
+            return default
+        return SnapshotEntry(self, index)
+
+    def __iter__(self):
+        return self.keys()
+
+    def get_entry_list(self):
+        """Get the list of entries, in the order they were written.
+        Entries are lazy, see :class:`SnapshotEntry`.
+
+        :returns: list -- entries
+        """
+        return [SnapshotEntry(self, index) for index in range(self._size)]
+
+
+class SnapshotEntry(Mapping):
+    """
+    A read-only, dict-like view of one entry of a :class:`Snapshot`.
+    Fields are read from the snapshot when accessed.
+    """
+    __slots__ = ('_snapshot', '_index')
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+
+    @property
+    def snapshot(self):
+        """The :class:`Snapshot` holding the entry"""
+        return self._snapshot
+
+    def __getitem__(self, field):
+        value = self._snapshot.value(self._index, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        for field, column in self._snapshot._columns.items():
+            if column[self._index] != MISSING:
+                yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return 'SnapshotEntry(%r)' % dict(self)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import unittest
+
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.customization import convert_to_unicode
+from bibtexparser.benchmarks.corpus import STYLES, generate_corpus
+from bibtexparser.benchmarks.run import run_benchmarks, compare, slowdowns
+
+
+class TestCorpus(unittest.TestCase):
+
+    def test_deterministic(self):
+        self.assertEqual(generate_corpus(50, seed=3), generate_corpus(50, seed=3))
+        self.assertNotEqual(generate_corpus(50, seed=3), generate_corpus(50, seed=4))
+
+    def test_styles_parse(self):
+        for style in STYLES:
+            bibtex = generate_corpus(100, style=style, abstracts=1)
+            entries = BibTexParser(bibtex, customization=convert_to_unicode,
+                                   ignore_nonstandard_types=False).get_entry_list()
+            self.assertEqual(len(entries), 100)
+            self.assertEqual(len(set(entry['id'] for entry in entries)), 100)
+            self.assertTrue(all('\n' in entry['abstract'] for entry in entries))
+
+    def test_strings(self):
+        bibtex = generate_corpus(20, strings=True, seed=1)
+        self.assertIn('@string{', bibtex)
+        entries = BibTexParser(bibtex).get_entry_list()
+        journals = set(entry['journal'] for entry in entries if 'journal' in entry)
+        self.assertTrue(journals)
+        self.assertTrue(all(' ' in journal for journal in journals - set(['Nature'])))
+        self.assertNotIn('@string{', generate_corpus(20, strings=False))
+
+    def test_accents(self):
+        self.assertNotIn('{\\', generate_corpus(20, accents=0))
+        bibtex = generate_corpus(20, accents=1)
+        self.assertIn('{\\', bibtex)
+        entries = BibTexParser(bibtex, customization=convert_to_unicode).get_entry_list()
+        self.assertFalse(any('{\\' in entry['title'] for entry in entries))
+
+    def test_unknown_style(self):
+        self.assertRaises(ValueError, generate_corpus, 10, style='endnote')
+
+
+class TestRun(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        results = run_benchmarks([20], names=['parse', 'to_json'], repeat=1)
+        self.assertEqual([(r['benchmark'], r['entries']) for r in results['results']],
+                         [('parse', 20), ('to_json', 20)])
+        self.assertTrue(all(r['seconds'] > 0 for r in results['results']))
+        lines = compare(results, results)
+        self.assertEqual(len(lines), 2)
+        self.assertIn('time x1.00', lines[0])
+        self.assertEqual(slowdowns(results, results, 1.5), [])
+
+    def test_unknown_benchmark(self):
+        self.assertRaises(ValueError, run_benchmarks, [10], names=['sort'])
+
+
+if __name__ == '__main__':
+    unittest.main()
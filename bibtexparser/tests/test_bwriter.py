@@ -7,9 +7,12 @@ from __future__ import unicode_literals
 
 import unittest
 import sys
+import os
+import shutil
+import tempfile
 
 from bibtexparser.bparser import BibTexParser
-from bibtexparser.bwriter import to_bibtex, to_json
+from bibtexparser.bwriter import to_bibtex, to_bibtex_patched, write_bibtex, to_json
 from bibtexparser.customization import author
 
 
@@ -64,3 +67,78 @@ class TestBibtexWriterList(unittest.TestCase):
         with open('bibtexparser/tests/data/article.bib', 'r') as bibfile:
             bib = BibTexParser(bibfile.read(), customization=author)
         self.assertRaises(TypeError, to_bibtex, bib)
+
+
+class TestBibtexWriterPatched(unittest.TestCase):
+
+    def setUp(self):
+        with open('bibtexparser/tests/data/multiple_entries.bib', 'r') as bibfile:
+            self.source = bibfile.read()
+        self.bib = BibTexParser(self.source, track_spans=True)
+
+    def test_unchanged(self):
+        self.assertEqual(self.source, to_bibtex_patched(self.bib))
+
+    def test_modified(self):
+        self.bib.get_entry_dict()['Wigner1938']['year'] = '1939'
+        result = to_bibtex_patched(self.bib)
+        before, after = self.source.split('@Article{Wigner1938', 1)
+        self.assertTrue(result.startswith(before))
+        self.assertTrue(result.endswith(after[after.index('@Book{Toto3000'):]))
+        self.assertIn(" Year = {1939},\n", result)
+        self.assertNotIn("Year                     = {1938}", result)
+
+    def test_removed_and_added(self):
+        entries = self.bib.get_entry_list()
+        del entries[0]
+        entries.append({'type': 'misc', 'id': 'New2020', 'title': 'New'})
+        result = to_bibtex_patched(self.bib)
+        self.assertNotIn('Yablon2005', result)
+        self.assertTrue(result.endswith('@misc{New2020,\n title = {New},\n}\n'))
+        self.assertEqual(len(BibTexParser(result).get_entry_list()), 3)
+
+    def test_source_names(self):
+        source = ('@Misc{Doe2000,\n Title = {Page},\n URL = {http://example.org},\n'
+                  ' keywords = {web},\n}\n')
+        bib = BibTexParser(source, track_spans=True)
+        entry = bib.get_entry_dict()['Doe2000']
+        self.assertIn('link', entry)
+        entry['title'] = 'Home page'
+        entry['year'] = '2000'
+        self.assertEqual(to_bibtex_patched(bib),
+                         '@Misc{Doe2000,\n Title = {Home page},\n URL = {http://example.org},\n'
+                         ' keywords = {web},\n year = {2000},\n}\n')
+
+    def test_comment_after_entry(self):
+        source = ('@article{First2000,\n title = {First},\n}\n'
+                  'Read again, see {Second2001}.\n\n'
+                  '@article{Second2001,\n title = {Second},\n} % draft\n'
+                  'The end.\n')
+        bib = BibTexParser(source, track_spans=True)
+        bib.get_entry_dict()['First2000']['title'] = 'Changed'
+        result = to_bibtex_patched(bib)
+        self.assertTrue(result.startswith('@article{First2000,\n title = {Changed},\n}\n'
+                                          'Read again, see {Second2001}.\n\n'))
+        del bib.get_entry_list()[1]
+        result = to_bibtex_patched(bib)
+        self.assertNotIn('Second2001,', result)
+        self.assertTrue(result.endswith('see {Second2001}.\n\n % draft\nThe end.\n'))
+
+    def test_without_spans(self):
+        bib = BibTexParser(self.source)
+        self.assertRaises(ValueError, to_bibtex_patched, bib)
+
+    def test_write(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'library.bib')
+            with open(filename, 'w') as bibfile:
+                bibfile.write(self.source)
+            self.bib.get_entry_dict()['Toto3000']['title'] = 'Another title'
+            write_bibtex(self.bib, filename)
+            with open(filename, 'r') as bibfile:
+                result = bibfile.read()
+            self.assertEqual(to_bibtex_patched(self.bib), result)
+            self.assertEqual(os.listdir(folder), ['library.bib'])
+        finally:
+            shutil.rmtree(folder)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.cli import main, process_file, validate
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'library.bib')
+        with io.open(self.filename, 'w', encoding='utf-8') as bibfile:
+            bibfile.write('@string{prl = "Physical Review Letters"}\n\n'
+                          '@article{Doe2000,\n title = {Caf\\\'{e}},\n journal = prl,\n}\n\n'
+                          '@article{Doe2001,\n author = {Doe, Jane},\n}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_validate(self):
+        data = '@article{A,\n title = {T},\n}\n@article{A,\n year = {2000},\n}\n@comment{nothing}\n'
+        self.assertEqual(validate(data, BibTexParser(data)),
+                         ['duplicate citekey A', 'A has no title'])
+
+    def test_validate_file(self):
+        result = process_file(('validate', self.filename, {}))
+        self.assertEqual(result['entries'], 2)
+        self.assertEqual(result['problems'], ['Doe2001 has no title'])
+        self.assertIsNone(result['error'])
+
+    def test_convert(self):
+        result = process_file(('convert', self.filename, {'conversion': 'unicode', 'memory': True}))
+        self.assertIn('Café', result['output'])
+        self.assertIsNone(result['error'])
+
+    def test_convert_in_place(self):
+        with io.open(self.filename, 'a', encoding='utf-8') as bibfile:
+            bibfile.write('% checked\n')
+        self.assertEqual(main(['convert', 'unicode', '--in-place', '-q', '-j', '1',
+                               self.filename]), 0)
+        with io.open(self.filename, encoding='utf-8') as bibfile:
+            result = bibfile.read()
+        self.assertTrue(result.startswith('@string{prl = "Physical Review Letters"}\n\n'))
+        self.assertIn(' title = {Café},\n', result)
+        self.assertTrue(result.endswith('\n\n@article{Doe2001,\n author = {Doe, Jane},\n}\n'
+                                        '% checked\n'))
+
+    def test_convert_keeps_field_names(self):
+        with io.open(self.filename, 'w', encoding='utf-8') as bibfile:
+            bibfile.write('@misc{Doe2002,\n title = {Caf\\\'{e}},\n url = {http://example.org},\n'
+                          ' keywords = {coffee},\n}\n')
+        self.assertEqual(main(['convert', 'unicode', '--in-place', '-q', '-j', '1',
+                               self.filename]), 0)
+        with io.open(self.filename, encoding='utf-8') as bibfile:
+            self.assertEqual(bibfile.read(), '@misc{Doe2002,\n title = {Café},\n'
+                             ' url = {http://example.org},\n keywords = {coffee},\n}\n')
+
+    def test_export_json(self):
+        output = os.path.join(self.folder, 'json')
+        self.assertEqual(main(['export', 'json', '-o', output, '-q', '-j', '1', self.filename]), 0)
+        with open(os.path.join(output, 'library.json')) as exported:
+            self.assertEqual(json.load(exported)['Doe2001']['author'], 'Doe, Jane')
+
+    def test_errors(self):
+        result = process_file(('validate', os.path.join(self.folder, 'missing.bib'), {}))
+        self.assertIsNotNone(result['error'])
+        self.assertEqual(main(['validate', '-q', '-j', '1', self.filename]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
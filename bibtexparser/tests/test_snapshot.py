@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.customization import convert_to_unicode
+from bibtexparser.snapshot import write_snapshot, Snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'library.snap')
+        with open('bibtexparser/tests/data/multiple_entries.bib', 'r') as bibfile:
+            self.entries = BibTexParser(bibfile.read(),
+                                        customization=convert_to_unicode).get_entry_list()
+        write_snapshot(self.entries, self.filename, meta={'mtime': 12.5})
+        self.snapshot = Snapshot(self.filename)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.folder)
+
+    def test_entries(self):
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertEqual([dict(e) for e in self.snapshot.get_entry_list()],
+                         self.entries)
+        self.assertEqual(self.snapshot.meta, {'mtime': 12.5})
+
+    def test_sizes(self):
+        self.assertEqual(self.snapshot.mapped_size, os.path.getsize(self.filename))
+        sizes = self.snapshot.field_sizes()
+        self.assertEqual(sizes['id'], len('Yablon2005Wigner1938Toto3000'))
+        self.assertEqual(sizes['type'], len('bookarticle'))
+        self.assertIs(self.snapshot.entry(0).snapshot, self.snapshot)
+
+    def test_lookup(self):
+        self.assertEqual(list(self.snapshot.keys()),
+                         ['Toto3000', 'Wigner1938', 'Yablon2005'])
+        self.assertIn('Wigner1938', self.snapshot)
+        self.assertNotIn('Wigner', self.snapshot)
+        self.assertEqual(self.snapshot['Wigner1938']['pages'], '29--41')
+        self.assertIsNone(self.snapshot['Toto3000'].get('year'))
+        self.assertIsNone(self.snapshot.get('Nobody'))
+        self.assertRaises(KeyError, lambda: self.snapshot['Nobody'])
+
+    def test_duplicates_and_unicode(self):
+        entries = [{'id': 'a', 'title': 'first'},
+                   {'id': 'b', 'title': 'Jean César'},
+                   {'id': 'a', 'title': 'second'}]
+        self.snapshot.close()
+        write_snapshot(entries, self.filename)
+        with Snapshot(self.filename) as snapshot:
+            self.assertEqual(list(snapshot.keys()), ['a', 'b'])
+            self.assertEqual(snapshot['a']['title'], 'second')
+            self.assertEqual(snapshot['b']['title'], 'Jean César')
+
+    def test_empty(self):
+        self.snapshot.close()
+        write_snapshot([], self.filename)
+        with Snapshot(self.filename) as snapshot:
+            self.assertEqual(len(snapshot), 0)
+            self.assertNotIn('a', snapshot)
+
+    def test_wrong_type(self):
+        self.assertRaises(TypeError, write_snapshot,
+                          [{'id': 'a', 'author': ['A', 'B']}], self.filename)
+
+    def test_not_a_snapshot(self):
+        self.snapshot.close()
+        with open(self.filename, 'wb') as snapfile:
+            snapfile.write(b'@article{a,\n}\n' * 20)
+        self.assertRaises(ValueError, Snapshot, self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
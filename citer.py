@@ -1,10 +1,26 @@
+import time
+_IMPORT_START = time.time()
+
 import sublime
 import sublime_plugin
 
 import sys
 import os.path
-import string
 import re
+import hashlib
+import bisect
+import threading
+import collections
+import contextlib
+import concurrent.futures
+import functools
+import math
+import types
+
+try:
+    import tracemalloc
+except ImportError:  # python < 3.4
+    tracemalloc = None
 
 reloader_name = 'citer.reloader'
 reloader_name = 'Citer.' + reloader_name
@@ -17,8 +33,12 @@ if reloader_name in sys.modules:
 if os.path.dirname(__file__) not in sys.path:
     sys.path.append(os.path.dirname(__file__))
 
-from bibtexparser.bparser import BibTexParser
-from bibtexparser.customization import convert_to_unicode
+from citerserver.index import (
+    entry_fingerprint, format_entry, FuzzyIndex, WordIndex, TrigramIndex,
+    recency_bonuses, citekey_matches, best_citekey_matches, containing)
+
+# bibtexparser (and its large latexenc tables) is only imported when the
+# first library is loaded, in the background, not when the plugin loads
 
 
 # settings cache globals
@@ -32,82 +52,310 @@ EXCLUDED_SCOPES = None
 PANDOC_FIX = None
 EXCLUDE = None
 COMPLETION_TYPE = None
+COMPLETION_MATCHING = None
+MAX_COMPLETIONS = None
+LINT_CITATIONS = None
+LIBRARY_CACHE_SIZE = None
+CITATION_SERVER = None
+SERVER_TIMEOUT = None
 
 # Internal Cache globals
+_SETTINGS_WINDOW = None  # id of the window whose project settings are in use
 _PAPERS = {}
-_YAMLBIB_PATH = None
-_LST_MOD_TIME = {}
-_DOCUMENTS = []
-_MENU = None
-_CITEKEYS = None
-_FORMATTED_INFO = {}  # for formatted paper info
+_WINDOW_BIBPATHS = {}  # window id -> bib files configured for the window
+_WINDOW_SETTINGS = {}  # window id -> settings of its libraries
+_LIBRARIES = {}  # (tuple of bib paths, settings) -> Library, see Library.key
+_VIEW_LIBRARIES = {}  # view id -> Library
+# held while the two above are updated, from the main or the async thread
+_LIBRARIES_LOCK = threading.Lock()
+
+# Per view completion results, narrowed while the prefix grows
+_COMPLETIONS_CACHE = {}
+
+# Recently cited citekeys, most recent last, favoured by completions
+_RECENT_CITEKEYS = collections.OrderedDict()
+RECENT_CITEKEYS_SIZE = 50
+
+# Citations of each buffer, by buffer id
+_CITATIONS = {}
+
+# Unknown citations linting, debounced per view
+_LINT_GENERATIONS = {}  # view id -> generation of the last lint request
+_LINT_DELAY = 500  # ms after the last modification
+
+# Background reload globals
+_RELOAD_LOCK = threading.Lock()
+_RELOAD_DELAY = 250  # ms, reload requests within this delay are coalesced
+
+
+class Stats:
+    """
+    Counters and latencies of what Citer does, shown by the Citer: Show
+    Performance Stats command. Only the last SAMPLES latencies of each
+    operation are kept.
+    """
+    SAMPLES = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = collections.Counter()
+        self.latencies = {}  # operation -> deque of seconds
+        self.totals = collections.Counter()  # operation -> total seconds
+
+    def count(self, name, increment=1):
+        with self.lock:
+            self.counters[name] += increment
+
+    def record(self, name, seconds):
+        with self.lock:
+            samples = self.latencies.get(name)
+            if samples is None:
+                samples = self.latencies[name] = collections.deque(maxlen=self.SAMPLES)
+            samples.append(seconds)
+            self.totals[name] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def timed(self, name):
+        """A decorator recording the latency of each call of a function"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self):
+        """The counters and latency percentiles, as text"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            latencies = sorted((name, sorted(samples), self.totals[name])
+                               for name, samples in self.latencies.items())
+        lines = ["Citer performance stats, over the last {0:.0f} s".format(
+            time.time() - self.started), ""]
+        lines.append("{0:<40} {1:>8} {2:>9} {3:>9} {4:>9} {5:>9} {6:>10}".format(
+            "latency (ms)", "calls", "p50", "p95", "p99", "max", "total"))
+        for name, samples, total in latencies:
+            lines.append("{0:<40} {1:>8} {2:>9.2f} {3:>9.2f} {4:>9.2f} {5:>9.2f} {6:>10.1f}".format(
+                name, len(samples), 1000 * _percentile(samples, 0.5),
+                1000 * _percentile(samples, 0.95), 1000 * _percentile(samples, 0.99),
+                1000 * samples[-1], 1000 * total))
+        lines += ["", "{0:<40} {1:>8}".format("counter", "count")]
+        lines += ["{0:<40} {1:>8}".format(name, count) for name, count in counters]
+        return '\n'.join(lines) + '\n'
+
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of sorted samples"""
+    return samples[max(0, min(len(samples) - 1, int(math.ceil(fraction * len(samples))) - 1))]
+
+
+_STATS = Stats()
 
 
 def plugin_loaded():
     """Called directly from sublime on plugin load"""
     refresh_settings()
-    refresh_caches()
+    sublime.load_settings('Citer.sublime-settings').add_on_change('citer', settings_changed)
+    view = sublime.active_window().active_view()
+    if view is not None:
+        warm_up(view)
+    print("Citer: plugin loaded in {0:.1f} ms".format(1000 * (time.time() - _IMPORT_START)))
+
+
+def warm_up(view):
+    """Start loading the library of a view in the background, if Citer
+    completes citations in it"""
+    if (not view.settings().get('is_widget') and
+            any(view.match_selector(0, scope) for scope in COMPLETIONS_SCOPES)):
+        if query_server(view, 'open') is None:
+            library_for_view(view)
 
 
 def plugin_unloaded():
-    pass
+    sublime.load_settings('Citer.sublime-settings').clear_on_change('citer')
+    if _LOADERS is not None:
+        _LOADERS.shutdown(wait=False)
+    stop_server()
 
 
-def load_yamlbib_path(view):
-    global _PAPERS
-    global _YAMLBIB_PATH
+_FRONT_MATTER = re.compile(r'---[ \t]*\r?\n(.*?)^(?:---|\.\.\.)[ \t]*$',
+                           re.MULTILINE | re.DOTALL)
+_BIBLIOGRAPHY = re.compile(r'^bibliography:[ \t]*(.*)$', re.MULTILINE)
+_LIST_ITEM = re.compile(r'[ \t]*-[ \t]+(.*)$')
 
-    filename = view.file_name()
-    if filename not in _PAPERS:
-        _PAPERS[filename] = Paper(view)
 
-    _YAMLBIB_PATH = _PAPERS[filename].bibpath()
+def parse_bibliography(front_matter):
+    """
+    Find the bib files of a `bibliography:` key in YAML front matter, given
+    either as a single path, a flow list `[a.bib, b.bib]` or a block list of
+    `- a.bib` lines.
+    """
+    match = _BIBLIOGRAPHY.search(front_matter)
+    if match is None:
+        return []
+    value = match.group(1).split(' #')[0].strip()
+    if value.startswith('['):
+        items = value.strip('[]').split(',')
+    elif value:
+        items = [value]
+    else:
+        items = []
+        for line in front_matter[match.end():].splitlines()[1:]:
+            item = _LIST_ITEM.match(line)
+            if item is None:
+                break
+            items.append(item.group(1).split(' #')[0])
+    items = [item.strip().strip('\'"') for item in items]
+    return [item for item in items if item]
 
 
 class Paper:
-    _filepath = None
-    _bibpath = None
-    _modified = None
+    """
+    The bib files declared in the YAML front matter of a document.
+
+    Only the leading front matter block is read, and only again once the
+    buffer was modified, so unsaved buffers work and documents without
+    front matter cost a single check of their first characters.
+    """
+    # Give up on front matter that does not end within this many characters
+    MAX_FRONT_MATTER = 65536
 
     def __init__(self, view):
         self.view = view
-        self._filepath = view.file_name()
+        self._change_count = None
+        self._bibpaths = []
+
+    def bibpaths(self):
+        change_count = self.view.change_count()
+        if change_count != self._change_count:
+            self._change_count = change_count
+            self._bibpaths = self._find_bibpaths()
+        # skip the files that do not exist (yet), such as a path being typed
+        return [path for path in self._bibpaths if os.path.isfile(path)]
+
+    def _front_matter(self):
+        size = self.view.size()
+        if self.view.substr(sublime.Region(0, min(3, size))) != '---':
+            return None
+        end = min(size, 4096)
+        while True:
+            match = _FRONT_MATTER.match(self.view.substr(sublime.Region(0, end)))
+            if match is not None:
+                return match.group(1)
+            if end >= min(size, self.MAX_FRONT_MATTER):
+                return None
+            end = min(size, end * 4)
+
+    def _find_bibpaths(self):
+        front_matter = self._front_matter()
+        if front_matter is None:
+            return []
+
+        filename = self.view.file_name()
+        folders = self.view.window().folders() if self.view.window() else []
+        if filename:
+            folder = os.path.dirname(os.path.realpath(filename))
+        elif folders:
+            folder = folders[0]
+        else:
+            folder = None
 
-    def bibpath(self):
-        modified = os.path.getmtime(self._filepath)
-        if self._modified != modified:
-            self._modified = modified
-            self._bibpath = None
+        bibpaths = []
+        for path in parse_bibliography(front_matter):
+            path = os.path.expanduser(path)
+            if os.path.isabs(path):
+                bibpaths.append(path)
+            elif folder is not None:
+                bibpaths.append(os.path.join(folder, path))
+        return bibpaths
 
-            text = self.view.substr(sublime.Region(0, self.view.size()))
-            yamlP = re.compile(r'^---$.*?((^---$)|(^\.\.\.$))', re.MULTILINE | re.DOTALL)
-            yamlMatch = yamlP.search(text)
 
-            if yamlMatch:
-                bibP = re.compile(r'^bibliography:', re.MULTILINE)
-                bibMatch = bibP.search(yamlMatch.group())
+def snapshot_path(bib_path, stat):
+    """
+    Where the parsed snapshot of a bib file is cached. Each version of the
+    file gets its own snapshot, so that a new one is never written over a
+    snapshot that is still memory-mapped.
+    """
+    digest = hashlib.sha1(os.path.abspath(bib_path).encode('utf-8')).hexdigest()
+    return os.path.join(sublime.cache_path(), 'Citer', '{0}-{1}-{2}.snap'.format(
+        digest, stat.st_size, int(stat.st_mtime * 1000000)))
 
-                if bibMatch:
-                    text = yamlMatch.group()[bibMatch.end():]
-                    pathP = re.compile(r'\S+')
-                    pathMatch = pathP.search(text)
 
-                    if pathMatch:
-                        folder = os.path.dirname(os.path.realpath(self._filepath))
-                        self._bibpath = os.path.join(folder, pathMatch.group())
+# Bumped whenever the entries Citer parses change for the same bib file
+# (parser options, customizations), so that older snapshots are not used
+SNAPSHOT_FORMAT = 1
 
-        return self._bibpath
 
+def snapshot_meta(stat):
+    """What a snapshot must have been written with to be used: the size and
+    mtime of its bib file, and the versions of the parser and of the format"""
+    import bibtexparser
+    return {'mtime': stat.st_mtime, 'size': stat.st_size,
+            'bibtexparser': bibtexparser.__version__, 'format': SNAPSHOT_FORMAT}
 
-def bibfile_modifed(bib_path):
-    global _LST_MOD_TIME
-    bib_path = bib_path.strip()
-    last_modified_time = os.path.getmtime(bib_path)
-    cached_modifed_time = _LST_MOD_TIME.get(bib_path)
-    if cached_modifed_time is None or last_modified_time != cached_modifed_time:
-        _LST_MOD_TIME[bib_path] = last_modified_time
-        return True
-    return False
+
+def remove_old_snapshots(snap_path):
+    """Remove the snapshots of previous versions of the bib file of snap_path"""
+    folder, name = os.path.split(snap_path)
+    digest = name.split('-', 1)[0]
+    for other in os.listdir(folder):
+        if other.startswith(digest) and other.endswith('.snap') and other != name:
+            try:
+                os.remove(os.path.join(folder, other))
+            except OSError:
+                # still mapped, on Windows: removed after the next change
+                pass
+
+
+def load_snapshot(bib_path):
+    """
+    Load the entries of a bib file from its cached snapshot, if the snapshot
+    is still up to date, see snapshot_meta. Entries are read lazily from the
+    memory-mapped file.
+    """
+    try:
+        stat = os.stat(bib_path)
+    except OSError:
+        _STATS.count("snapshot misses")
+        return None
+    snap_path = snapshot_path(bib_path, stat)
+    if not os.path.exists(snap_path):
+        _STATS.count("snapshot misses")
+        return None
+    try:
+        from bibtexparser.snapshot import Snapshot
+        snapshot = Snapshot(snap_path)
+    except Exception:
+        _STATS.count("snapshot misses")
+        return None
+    if snapshot.meta != snapshot_meta(stat):
+        snapshot.close()
+        _STATS.count("snapshot misses")
+        return None
+    _STATS.count("snapshot hits")
+    return snapshot.get_entry_list()
+
+
+def save_snapshot(bib_path, entries):
+    try:
+        from bibtexparser.snapshot import write_snapshot
+        stat = os.stat(bib_path)
+        snap_path = snapshot_path(bib_path, stat)
+        if not os.path.isdir(os.path.dirname(snap_path)):
+            os.makedirs(os.path.dirname(snap_path))
+        write_snapshot(entries, snap_path, meta=snapshot_meta(stat))
+        remove_old_snapshots(snap_path)
+    except Exception as e:
+        print("Citer: could not cache {0}: {1}".format(bib_path, e))
 
 
 def load_bibfile(bib_path):
@@ -116,16 +364,30 @@ def load_bibfile(bib_path):
         return []
 
     bib_path = bib_path.strip()
+    if not os.path.exists(bib_path):
+        # not worth a dialog: front matter paths are checked as they are typed
+        sublime.status_message("WARNING: BibTeX file {0} not found".format(bib_path))
+        return []
+    entries = load_snapshot(bib_path)
+    if entries is not None:
+        return entries
+
+    from bibtexparser.bparser import BibTexParser
+    from bibtexparser.customization import convert_to_unicode
     try:
-        with open(bib_path, 'r', encoding="utf-8") as bibfile:
+        with open(bib_path, 'r', encoding="utf-8") as bibfile, \
+                _STATS.timer("parse " + os.path.basename(bib_path)):
             bp = BibTexParser(bibfile.read(),
                               customization=convert_to_unicode,
                               ignore_nonstandard_types=False)
-            return list(bp.get_entry_list())
+            entries = list(bp.get_entry_list())
     except Exception as e:
         sublime.error_message("Error reading BibTeX file: {0}".format(str(e)))
         return []
 
+    save_snapshot(bib_path, entries)
+    return entries
+
 
 def refresh_settings():
     global BIBFILE_PATH
@@ -138,138 +400,934 @@ def refresh_settings():
     global PANDOC_FIX
     global QUICKVIEW_FORMAT
     global COMPLETION_TYPE
+    global COMPLETION_MATCHING
+    global MAX_COMPLETIONS
+    global LINT_CITATIONS
+    global LIBRARY_CACHE_SIZE
+    global CITATION_SERVER
+    global SERVER_TIMEOUT
+    global _SETTINGS_WINDOW
 
     def get_settings(setting, default):
         project_data = sublime.active_window().project_data()
-        if setting == 'bibtex_file_path':
-            setting = 'bibtex_file'
-
         if project_data and setting in project_data:
-            if setting == 'bibtex_file':
-                window = sublime.active_window()
-                ref_dir = os.path.dirname(window.project_file_name())
-                result = ref_dir + '/' + project_data['bibtex_file']
-                return result
             return project_data[setting]
         return settings.get(setting, default)
 
+    _SETTINGS_WINDOW = sublime.active_window().id()
     settings = sublime.load_settings('Citer.sublime-settings')
-    BIBFILE_PATH = get_settings('bibtex_file_path', None)
-    SEARCH_IN = get_settings('search_fields', ["author", "title", "year", "id", "abstract"])
+    # projects can override these for their window, see window_bibpaths
+    # and window_library_settings
+    BIBFILE_PATH = settings.get('bibtex_file', None)
+    SEARCH_IN = settings.get('search_fields', ["author", "title", "year", "id", "abstract"])
     CITATION_FORMAT = get_settings('citation_format', "@%s")
     COMPLETIONS_SCOPES = get_settings('completions_scopes', ['text.html.markdown'])
     EXCLUDED_SCOPES = get_settings('excluded_scopes', [])
 
     ENABLE_COMPLETIONS = get_settings('enable_completions', True)
-    QUICKVIEW_FORMAT = get_settings('quickview_format', '{citekey} - {title}')
+    QUICKVIEW_FORMAT = settings.get('quickview_format', '{citekey} - {title}')
     PANDOC_FIX = get_settings('auto_merge_citations', False)
     EXCLUDE = get_settings('hide_other_completions', True)
     # If completion_type is not configured in the setting, `citekey` is the default
     COMPLETION_TYPE = get_settings('completion_type', 'citekey') 
+    # `fuzzy` ranks subsequence matches, `substring` keeps plain substring matches
+    COMPLETION_MATCHING = get_settings('completion_matching', 'fuzzy')
+    # Completions listed at most, the best ones
+    MAX_COMPLETIONS = get_settings('max_completions', 100)
+    # Underline the citations missing from the library
+    LINT_CITATIONS = get_settings('lint_citations', True)
+    # Megabytes of bib files kept parsed once no open document uses them
+    LIBRARY_CACHE_SIZE = get_settings('library_cache_size', 256)
+    _BIBFILES.budget = LIBRARY_CACHE_SIZE * 2 ** 20
+    _BIBFILES.evict()
+    # Python interpreter running the citation server, none by default
+    CITATION_SERVER = get_settings('citation_server', None)
+    # Milliseconds to wait for an answer of the citation server
+    SERVER_TIMEOUT = get_settings('server_timeout', 300)
+
+
+def settings_changed():
+    """
+    Re-read the settings after they or the project changed, and only
+    invalidate what depends on the ones that did: the bib files of the
+    windows for `bibtex_file`, the libraries for `quickview_format` and
+    `search_fields` (which then only re-render their menu or rebuild their
+    search indexes, see update_library_settings) and the underlined
+    citations for the linting settings.
+    """
+    old_bibfile = BIBFILE_PATH
+    old_library = (QUICKVIEW_FORMAT, SEARCH_IN)
+    old_lint = (LINT_CITATIONS, COMPLETIONS_SCOPES, EXCLUDED_SCOPES)
+    old_server = (CITATION_SERVER, QUICKVIEW_FORMAT, SEARCH_IN)
+    refresh_settings()
 
+    if (CITATION_SERVER, QUICKVIEW_FORMAT, SEARCH_IN) != old_server:
+        # started again with the new settings on the next query
+        stop_server()
+    if BIBFILE_PATH != old_bibfile:
+        # libraries are resolved again the next time each view uses them
+        _WINDOW_BIBPATHS.clear()
+    if (QUICKVIEW_FORMAT, SEARCH_IN) != old_library:
+        _WINDOW_SETTINGS.clear()
+    if update_library_settings() or (
+            LINT_CITATIONS, COMPLETIONS_SCOPES, EXCLUDED_SCOPES) != old_lint:
+        # which also moves views to the library of their new settings
+        for view_id in list(_VIEW_LIBRARIES):
+            request_lint(sublime.View(view_id), delay=0)
+
+
+def window_bibpaths(window):
+    """
+    The bib files configured for a window: the `bibtex_file` of its project,
+    relative to the project file, or else the one of the Citer settings.
+    Cached per window, so that each window keeps using its own files
+    whichever window has the focus.
+    """
+    paths = _WINDOW_BIBPATHS.get(window.id())
+    if paths is not None:
+        return paths
+
+    project_data = window.project_data()
+    if project_data and 'bibtex_file' in project_data:
+        configured = project_data['bibtex_file']
+        project_file = window.project_file_name()
+    else:
+        configured = BIBFILE_PATH
+        project_file = None
 
-def refresh_caches():
-    global _DOCUMENTS
-    global _MENU
-    global _CITEKEYS
-    global _FORMATTED_INFO
-
+    if configured is None:
+        configured = []
+    elif not isinstance(configured, list):
+        configured = [configured]
     paths = []
-    if BIBFILE_PATH is not None:
-        if isinstance(BIBFILE_PATH, list):
-            paths += [os.path.expandvars(path) for path in BIBFILE_PATH]
-        else:
-            paths.append(os.path.expandvars(BIBFILE_PATH))
-    if _YAMLBIB_PATH is not None:
-        paths.append(_YAMLBIB_PATH)
+    for path in configured:
+        path = os.path.expandvars(path.strip())
+        if project_file is not None:
+            # relative to the project file, absolute paths are kept as is
+            path = os.path.join(os.path.dirname(project_file), path)
+        paths.append(path)
+    paths = _WINDOW_BIBPATHS[window.id()] = tuple(paths)
+    return paths
+
+
+def window_library_settings(window):
+    """
+    The settings the libraries of a window are built with, as a
+    (quickview_format, search_fields) tuple: those of its project, or else
+    those of the Citer settings. Cached per window, like window_bibpaths.
+    """
+    settings = _WINDOW_SETTINGS.get(window.id())
+    if settings is not None:
+        return settings
 
-    if len(paths) == 0:
+    project_data = window.project_data() or {}
+    settings = _WINDOW_SETTINGS[window.id()] = (
+        project_data.get('quickview_format', QUICKVIEW_FORMAT),
+        tuple(project_data.get('search_fields', SEARCH_IN)))
+    return settings
+
+
+def update_library_settings():
+    """
+    After the settings of windows changed, give the new settings to the
+    libraries whose views all use the same ones, unless another library of
+    the same files already has them: the library then only re-renders its
+    menu or rebuilds its search indexes. Views whose library keeps its
+    settings move to another one the next time they use it.
+
+    :returns: bool -- whether the settings of any view changed
+    """
+    changed = False
+    with _LIBRARIES_LOCK:
+        for library in list(_LIBRARIES.values()):
+            wanted = set()
+            for view_id in library.views:
+                window = sublime.View(view_id).window()
+                if window is not None:
+                    wanted.add(window_library_settings(window))
+            changed = changed or bool(wanted - set([library.settings]))
+            if len(wanted) != 1:
+                continue
+            settings = wanted.pop()
+            if settings != library.settings and (library.paths, settings) not in _LIBRARIES:
+                del _LIBRARIES[library.key]
+                library.settings = settings
+                _LIBRARIES[library.key] = library
+                request_reload(library, delay=0)
+    return changed
+
+
+def library_paths(view):
+    """The bib files of a view: the ones configured for its window, then
+    those declared in its front matter, each once"""
+    window = view.window() or sublime.active_window()
+    paths = window_bibpaths(window)
+
+    paper = _PAPERS.get(view.id())
+    if paper is None:
+        paper = _PAPERS[view.id()] = Paper(view)
+    paths = paths + tuple(path.strip() for path in paper.bibpaths())
+    # a file listed twice would be loaded twice, concurrently
+    return tuple(collections.OrderedDict.fromkeys(paths))
+
+
+def library_for_view(view):
+    """
+    The library of a view. Views with the same bib files share a library,
+    which is created and loaded the first time a view needs it, and closed
+    when the last view using it is closed or switches to other files or
+    settings.
+    """
+    key = (library_paths(view), window_library_settings(view.window() or sublime.active_window()))
+    with _LIBRARIES_LOCK:
+        library = _VIEW_LIBRARIES.get(view.id())
+        if library is not None and library.key == key:
+            return library
+
+        new_library = _LIBRARIES.get(key)
+        if new_library is None:
+            new_library = _LIBRARIES[key] = Library(*key)
+            request_reload(new_library, delay=0)
+        new_library.views.add(view.id())
+        _VIEW_LIBRARIES[view.id()] = new_library
+        if library is not None:
+            _release_library(library, view.id())
+        return new_library
+
+
+def release_view(view):
+    """Forget everything about a closed view"""
+    _PAPERS.pop(view.id(), None)
+    _COMPLETIONS_CACHE.pop(view.id(), None)
+    _CITATIONS.pop(view.buffer_id(), None)
+    _LINT_GENERATIONS.pop(view.id(), None)
+    with _LIBRARIES_LOCK:
+        library = _VIEW_LIBRARIES.pop(view.id(), None)
+        if library is not None:
+            _release_library(library, view.id())
+
+
+def _release_library(library, view_id):
+    # with _LIBRARIES_LOCK held
+    library.views.discard(view_id)
+    if not library.views:
+        del _LIBRARIES[library.key]
+        library.close()
+
+
+def request_reload(library, delay=_RELOAD_DELAY):
+    """
+    Reload a library in the background, on Sublime's async thread.
+
+    Requests made within `delay` of each other are coalesced into a single
+    reload, and since the async thread runs one callback at a time, requests
+    made while a reload is running result in a single follow-up reload.
+    Meanwhile, commands and completions keep using the current library.
+    """
+    with _RELOAD_LOCK:
+        library.reload_generation += 1
+        generation = library.reload_generation
+    if not library.paths:
         sublime.status_message("WARNING: No BibTeX file configured for Citer")
-    else:
-        modified = any(bibfile_modifed(single_path) for single_path in paths)
-        if modified:
-            _DOCUMENTS = []
-            for single_path in paths:
-                _DOCUMENTS += load_bibfile(single_path)
-
-    _CITEKEYS = [doc.get('id') for doc in _DOCUMENTS]
-
-    # Build formatted info dictionary with author, year, abstract
-    _FORMATTED_INFO = {}
-    for doc in _DOCUMENTS:
-        citekey = doc.get('id', 'Unknown')
-        title = doc.get('title', 'No Title').replace('{', '').replace('}', '')
-        year = doc.get('year', 'n.d.')
-        abstract = doc.get('abstract', None)
-
-        if doc.get('author') is not None:
-            auths = _parse_authors(doc.get('author'))
-        else:
-            auths = 'Anon'
+    elif not library.loaded:
+        sublime.status_message("Citer: loading BibTeX library...")
+    sublime.set_timeout_async(lambda: _reload(library, generation), delay)
+
+
+def _reload(library, generation):
+    if generation != library.reload_generation or library.closed:
+        # a more recent request will do the reload, or nobody needs it
+        return
+
+    def cancelled():
+        # no open view uses the library anymore
+        return library.closed
+
+    if library.refresh(cancelled):
+        for view_id in list(library.views):
+            request_lint(sublime.View(view_id), delay=0)
+
+
+_SERVER = None  # citerserver.client.Client, see citation_server
+_SERVER_FAILED = None  # the citation_server setting the server failed to start with
+_SERVER_RESTARTS = 0
+SERVER_RESTARTS = 3  # times a server that exited is started again
+
+
+def citation_server():
+    """
+    The client of the citation server, started on first use with the Python
+    interpreter of the `citation_server` setting, or None if the setting is
+    not set or the server failed. A server that exited is started again,
+    up to SERVER_RESTARTS times, unless it exited before answering anything.
+    """
+    global _SERVER, _SERVER_FAILED, _SERVER_RESTARTS
+    if not CITATION_SERVER or CITATION_SERVER == _SERVER_FAILED:
+        return None
+    if _SERVER is not None:
+        if _SERVER.alive:
+            return _SERVER
+        if not _SERVER.answered or _SERVER_RESTARTS >= SERVER_RESTARTS:
+            _SERVER_FAILED = CITATION_SERVER
+            _SERVER.close()
+            _SERVER = None
+            print("Citer: the citation server started with {0} exited, "
+                  "Citer loads libraries itself".format(CITATION_SERVER))
+            return None
+        _SERVER_RESTARTS += 1
+    from citerserver.client import Client
+    try:
+        server = Client([CITATION_SERVER, '-m', 'citerserver'], cwd=os.path.dirname(__file__))
+        # answered before any query, since requests are answered in order
+        server.notify('initialize', {'quickview_format': QUICKVIEW_FORMAT,
+                                     'search_fields': SEARCH_IN})
+    except Exception as e:
+        _SERVER_FAILED = CITATION_SERVER
+        print("Citer: could not start the citation server with {0}: {1}".format(CITATION_SERVER, e))
+        return None
+    _SERVER = server
+    return server
+
+
+def stop_server():
+    global _SERVER, _SERVER_FAILED, _SERVER_RESTARTS
+    server, _SERVER, _SERVER_FAILED, _SERVER_RESTARTS = _SERVER, None, None, 0
+    if server is not None:
+        sublime.set_timeout_async(server.close)
 
-        formatted_title = string.Formatter().vformat(QUICKVIEW_FORMAT, (), SafeDict(
-            citekey=citekey,
-            title=title,
-            author=auths,
-            year=year
-        ))
 
-        # Store full info for popup
-        _FORMATTED_INFO[citekey] = {
-            'title': title,
-            'author': auths,
-            'year': year,
-            'abstract': abstract,
-            'formatted_title': formatted_title
-        }
+def query_server(view, method, **params):
+    """
+    Ask the citation server about the library of a view.
+
+    :returns: dict -- the result, empty if the server did not answer within
+    SERVER_TIMEOUT or failed, or None without server or if it just failed
+    for good: the caller then uses the library loaded in Sublime
+    """
+    server = citation_server()
+    if server is None:
+        return None
+    from citerserver.client import ServerError, ServerTimeout
+    params['paths'] = list(library_paths(view))
+    quickview_format, search_fields = window_library_settings(view.window() or sublime.active_window())
+    params['settings'] = {'quickview_format': quickview_format,
+                          'search_fields': list(search_fields)}
+    try:
+        with _STATS.timer("server " + method):
+            return server.request(method, params, SERVER_TIMEOUT / 1000.0)
+    except ServerTimeout:
+        _STATS.count("server timeouts")
+    except ServerError as e:
+        _STATS.count("server errors")
+        print("Citer: the citation server failed to answer {0}: {1}".format(method, e))
+        if not server.alive and citation_server() is None:
+            return None
+    return {}
+
+
+class BibFile:
+    """A bib file and its entries, reloaded only when its mtime changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.size = 0
+        self.loaded = False
+        self.entries = []
+        # incremented on each reload, so that libraries sharing the file
+        # can tell it changed since they last merged it
+        self.generation = 0
+
+    def refresh(self):
+        """Reload the entries if the file changed, returns True if it did"""
+        try:
+            stat = os.stat(self.path)
+            mtime, size = stat.st_mtime, stat.st_size
+        except OSError:
+            mtime, size = None, 0
+        if self.loaded and mtime == self.mtime:
+            _STATS.count("reload cache hits")
+            return False
+        self.mtime = mtime
+        self.size = size
+        self.loaded = True
+        with _STATS.timer("load " + os.path.basename(self.path)):
+            self.entries = load_bibfile(self.path)
+        _STATS.count("reload cache misses")
+        _STATS.count("entries loaded", len(self.entries))
+        self.generation += 1
+        return True
+
+
+class BibFilePool:
+    """
+    Parsed bib files, shared by all the libraries using them and reference
+    counted by those libraries. Files that no library uses anymore stay
+    parsed, so that reopening a document does not reload them, until their
+    total size exceeds the budget: the least recently used are then dropped.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.bibfiles = collections.OrderedDict()  # least recently used first
+        self.refcounts = {}
+
+    def acquire(self, path):
+        with self.lock:
+            bibfile = self.bibfiles.pop(path, None) or BibFile(path)
+            self.bibfiles[path] = bibfile
+            self.refcounts[path] = self.refcounts.get(path, 0) + 1
+            return bibfile
+
+    def release(self, path):
+        with self.lock:
+            self.refcounts[path] -= 1
+            if not self.refcounts[path]:
+                del self.refcounts[path]
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            # files that were never read (not loaded yet, or missing) are
+            # worth nothing once no library uses them
+            for path, bibfile in list(self.bibfiles.items()):
+                if path not in self.refcounts and bibfile.mtime is None:
+                    del self.bibfiles[path]
+            total = sum(bibfile.size for bibfile in self.bibfiles.values())
+            for path in list(self.bibfiles):
+                if total <= self.budget:
+                    break
+                if path not in self.refcounts:
+                    total -= self.bibfiles.pop(path).size
+
+
+_BIBFILES = BibFilePool(256 * 2 ** 20)
+
+# Threads loading the bib files of a library concurrently, created with the
+# first library of several files. Threads rather than processes: the plugin
+# host cannot start Python processes, and the parsed entries would have to
+# be pickled back, which costs about as much as parsing them. Reading files
+# and snapshots still overlaps, and parsing runs alongside it.
+_LOADERS = None
+LOAD_THREADS = 4
+
+
+def refresh_bibfiles(bibfiles, cancelled=None):
+    """Refresh bib files, concurrently if there are several. A cancelled
+    refresh stops starting to load files, but finishes those started.
+
+    :returns: bool -- whether all the files were refreshed
+    """
+    global _LOADERS
+    if len(bibfiles) < 2:
+        for bibfile in bibfiles:
+            if cancelled is not None and cancelled():
+                return False
+            bibfile.refresh()
+        return True
+
+    if _LOADERS is None:
+        _LOADERS = concurrent.futures.ThreadPoolExecutor(LOAD_THREADS)
 
-    # Build menu from formatted titles
-    _MENU = [[info['formatted_title']] for info in _FORMATTED_INFO.values()]
-    _MENU = sorted(_MENU)
+    def refresh(bibfile):
+        if cancelled is not None and cancelled():
+            return False
+        bibfile.refresh()
+        return True
+
+    # map waits for all the files, in order, and raises their errors here
+    return all(list(_LOADERS.map(refresh, bibfiles)))
+
+
+class Library:
+    """
+    The entries of a list of bib files and the structures derived from them.
+
+    Each file is only reloaded when it changed on disk. The entries added,
+    removed or changed by a reload (compared by fingerprint) are then used
+    to patch the derived structures, which are left untouched when no file
+    was modified.
+    """
+    # Above this number of changed entries, re-sort the menu and rebuild
+    # the search indexes from scratch instead of patching them
+    MENU_PATCH_LIMIT = 256
+    # Number of rendered citation popups kept
+    POPUP_CACHE_SIZE = 128
+
+    def __init__(self, paths, settings=None):
+        self.paths = tuple(paths)
+        # (quickview_format, search_fields), those of the Citer settings by
+        # default, see window_library_settings
+        self.settings = settings or (QUICKVIEW_FORMAT, tuple(SEARCH_IN))
+        self.views = set()  # ids of the views using the library
+        self.closed = False
+        self.loaded = False
+        self.version = 0
+        self.reload_generation = 0
+        # held while the search indexes are patched in place or searched
+        self.lock = threading.Lock()
+        self.bibfiles = [_BIBFILES.acquire(path) for path in self.paths]
+        self.generations = None  # of each bib file, when last merged
+        self.documents = []
+        self.entries = {}  # citekey -> entry, later files win
+        self.citekeys = []
+        self.completion_keys = []  # sorted (lowercase key, key) pairs
+        self._fuzzy_index = None
+        self.formatted_info = {}
+        self.popups = collections.OrderedDict()  # citekey -> popup content
+        self.menu = []
+        self.quickview_format = None  # the one the menu was rendered with
+        self.word_index = WordIndex([])
+        self.search_trigrams = TrigramIndex([])
+        self.key_trigrams = TrigramIndex(['id'])
+
+    @property
+    def key(self):
+        return (self.paths, self.settings)
+
+    def close(self):
+        """Give the bib files back to the pool"""
+        self.closed = True
+        for path in self.paths:
+            _BIBFILES.release(path)
+
+    @_STATS.timed("library refresh")
+    def refresh(self, cancelled=None):
+        """Reload modified files and update the derived structures.
+
+        The structures are replaced rather than modified, so that they can
+        be read from another thread during a refresh.
+
+        :param cancelled: a function called before loading each file, the
+        refresh is abandoned if it returns True
+        :returns: bool -- whether anything changed
+        """
+        start = time.time()
+        if not refresh_bibfiles(self.bibfiles, cancelled):
+            return False
+        _BIBFILES.evict()
+        first_load = not self.loaded
+        self.loaded = True
+        generations = [bibfile.generation for bibfile in self.bibfiles]
+        quickview_format, search_fields = self.settings
+        if (generations == self.generations and
+                self.quickview_format == quickview_format and
+                self.word_index.fields == list(search_fields)):
+            return False
+        self.generations = generations
+
+        documents = []
+        for bibfile in self.bibfiles:
+            documents += bibfile.entries
+        entries = {}
+        for doc in documents:
+            entries[doc.get('id', 'Unknown')] = doc
+
+        old_entries = self.entries
+        removed = [key for key in old_entries if key not in entries]
+        added = [key for key in entries if key not in old_entries]
+        changed = []
+        for key, doc in entries.items():
+            old_doc = old_entries.get(key)
+            if old_doc is None or old_doc is doc:
+                continue
+            if entry_fingerprint(old_doc) != entry_fingerprint(doc):
+                changed.append(key)
+            else:
+                # same content, only keep the new entry alive
+                self.formatted_info[key]['entry'] = doc
+
+        rerender = self.quickview_format != quickview_format
+        self.quickview_format = quickview_format
+        self.apply_delta(documents, entries, added, removed, changed, rerender)
+        if first_load:
+            print("Citer: loaded {0} in {1:.0f} ms".format(
+                ', '.join(self.paths) or 'no bib file', 1000 * (time.time() - start)))
+        return True
+
+    def apply_delta(self, documents, entries, added, removed, changed, rerender=False):
+        """Publish new entries, patching copies of the derived structures
+        with the changed ones. If rerender is set, the menu and formatted
+        entries are rebuilt, e.g. for a new quickview format."""
+        citekeys = self.citekeys
+        completion_keys = self.completion_keys
+        if added or removed:
+            citekeys = [doc.get('id') for doc in documents]
+            if len(added) + len(removed) <= self.MENU_PATCH_LIMIT:
+                completion_keys = list(completion_keys)
+                for key in removed:
+                    index = bisect.bisect_left(completion_keys, (key.lower(), key))
+                    if index < len(completion_keys) and completion_keys[index][1] == key:
+                        del completion_keys[index]
+                for key in added:
+                    bisect.insort(completion_keys, (key.lower(), key))
+            else:
+                completion_keys = sorted((key.lower(), key) for key in entries)
+
+        patch_menu = len(added) + len(removed) + len(changed) <= self.MENU_PATCH_LIMIT
+        if rerender:
+            formatted_info = dict((key, format_entry(doc, self.quickview_format))
+                                  for key, doc in entries.items())
+        else:
+            formatted_info = dict(self.formatted_info)
+            menu = list(self.menu) if patch_menu else None
+            for key in removed + changed:
+                info = formatted_info.pop(key, None)
+                if info is not None and patch_menu:
+                    item = [info['formatted_title']]
+                    index = bisect.bisect_left(menu, item)
+                    if index < len(menu) and menu[index] == item:
+                        del menu[index]
+
+            for key in added + changed:
+                info = formatted_info[key] = format_entry(entries[key], self.quickview_format)
+                if patch_menu:
+                    bisect.insort(menu, [info['formatted_title']])
+
+        if rerender or not patch_menu:
+            # Build menu from formatted titles
+            menu = sorted([info['formatted_title']]
+                          for info in formatted_info.values())
+
+        word_index = self.word_index
+        search_trigrams = self.search_trigrams
+        key_trigrams = self.key_trigrams
+        search_fields = list(self.settings[1])
+        if (not patch_menu or word_index.fields != search_fields or
+                search_trigrams.removed > len(search_trigrams.ids)):
+            word_index = WordIndex(search_fields, entries)
+            search_trigrams = TrigramIndex(search_fields, entries)
+            key_trigrams = TrigramIndex(['id'], entries)
+        else:
+            with self.lock:
+                for key in removed + changed:
+                    word_index.remove(key, self.entries[key])
+                    search_trigrams.remove(key)
+                for key in added + changed:
+                    word_index.add(key, entries[key])
+                    search_trigrams.add(key, entries[key])
+                for key in removed:
+                    key_trigrams.remove(key)
+                for key in added:
+                    key_trigrams.add(key, entries[key])
+                search_trigrams.prepare()
+
+        self.documents = documents
+        self.entries = entries
+        self.citekeys = citekeys
+        self.completion_keys = completion_keys
+        self.formatted_info = formatted_info
+        self.popups = collections.OrderedDict()
+        self.menu = menu
+        self.word_index = word_index
+        self.search_trigrams = search_trigrams
+        self.key_trigrams = key_trigrams
+        self.version += 1
+        # build the fuzzy index here, in the background, rather than on the
+        # first keystroke
+        self.fuzzy_index()
+
+    def popup(self, citekey):
+        """The popup content of a citekey, or None if it is not in the library.
+        The most recently shown popups are kept rendered."""
+        popups = self.popups
+        content = popups.get(citekey)
+        if content is not None:
+            _STATS.count("popup cache hits")
+            popups.move_to_end(citekey)
+            return content
+        info = self.formatted_info.get(citekey)
+        if info is None:
+            return None
+        _STATS.count("popup cache misses")
+        content = popups[citekey] = citation_popup(info)
+        if len(popups) > self.POPUP_CACHE_SIZE:
+            popups.popitem(last=False)
+        return content
+
+    def fuzzy_index(self):
+        """The fuzzy index of the current entries"""
+        index = self._fuzzy_index
+        if index is None or index[0] != self.version:
+            index = self._fuzzy_index = (self.version, FuzzyIndex(self.formatted_info))
+        return index[1]
+
+    def complete(self, search):
+        """
+        Find the citekeys matching a lowercase search: first those starting
+        with it, then those only containing it, among the candidates of the
+        citekey trigram index.
+
+        :returns: list -- (lowercase key, key) pairs
+        """
+        with self.lock:
+            candidates = self.key_trigrams.candidates(search)
+        return citekey_matches(self.completion_keys, candidates, search)
+
+    def search(self, query, within=None):
+        """
+        Citekeys of the entries with a search field containing query, most
+        relevant first. Candidates come from the trigram index, so only a
+        few entries need the substring test.
+
+        :param within: citekeys known to contain every match, e.g. the
+        results of a query that this one extends
+        """
+        term = query.lower()
+        entries = self.entries
+        with self.lock:
+            fields = self.search_trigrams.fields
+            candidates = self.search_trigrams.candidates(term)
+        if within is not None and (candidates is None or len(within) < len(candidates)):
+            candidates = within
+        elif candidates is None:
+            candidates = list(entries)
+
+        results = containing(entries, fields, term, candidates)
+        with self.lock:
+            return self.word_index.rank(query, results)
 
 
 # Helper function to find citations
+_CITATION = re.compile(r'(?<!\w)@([^\s\.,;:?!()\[\]\{\}\'"]+)')
+
+
+class CitationIndex:
+    """
+    The citations of a buffer, as sorted (start, end, citekey) spans.
+
+    Edits shift the spans after them and mark the lines they touch as
+    dirty; only those lines are scanned again, the next time the index is
+    used. Citations never span several lines, so rescanning whole lines
+    is exact. If edits were missed, the whole buffer is scanned again.
+
+    Lint reads the index on the async thread while edits are applied on the
+    main thread, so both go through the lock.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.lock = threading.Lock()
+        self.change_count = None
+        self.starts = []
+        self.spans = []
+        self.dirty = []  # (begin, end) regions to rescan
+
+    def edited(self, changes):
+        """Apply the changes of a TextChangeListener, in order"""
+        with self.lock:
+            self._edited(changes)
+
+    def _edited(self, changes):
+        if self.change_count is None:
+            return
+        for change in changes:
+            begin, end = change.a.pt, change.b.pt
+            delta = len(change.str) - (end - begin)
+            # spans touching the edit are dropped, the following ones shifted
+            first = bisect.bisect_left(self.starts, begin)
+            while first and self.spans[first - 1][1] >= begin:
+                first -= 1
+            last = bisect.bisect_right(self.starts, end)
+            self.spans[first:] = [(start + delta, stop + delta, key)
+                                  for start, stop, key in self.spans[last:]]
+            self.starts = [span[0] for span in self.spans]
+            self.dirty = [(b if b <= begin else max(b + delta, begin),
+                           e if e < begin else max(e + delta, begin))
+                          for b, e in self.dirty]
+            self.dirty.append((begin, end + delta))
+        self.change_count = self.view.change_count()
+
+    def _scan(self, region):
+        offset = region.begin()
+        return [(offset + match.start(), offset + match.end(), match.group(1))
+                for match in _CITATION.finditer(self.view.substr(region))]
+
+    def update(self):
+        if self.change_count != self.view.change_count():
+            self.spans = self._scan(sublime.Region(0, self.view.size()))
+            self.starts = [span[0] for span in self.spans]
+            self.change_count = self.view.change_count()
+            self.dirty = []
+            return
+        for begin, end in self.dirty:
+            lines = self.view.full_line(sublime.Region(begin, end))
+            first = bisect.bisect_left(self.starts, lines.begin())
+            last = bisect.bisect_left(self.starts, lines.end())
+            self.spans[first:last] = self._scan(lines)
+            self.starts = [span[0] for span in self.spans]
+        self.dirty = []
+
+    def citations(self):
+        """All the (start, end, citekey) spans, in order"""
+        with self.lock:
+            self.update()
+            return list(self.spans)
+
+    def at(self, point):
+        """The citation around a point.
+
+        :returns: tuple -- (start, end, citekey), or None
+        """
+        with self.lock:
+            self.update()
+            index = bisect.bisect_right(self.starts, point) - 1
+            if index >= 0 and point <= self.spans[index][1]:
+                return self.spans[index]
+            return None
+
+
+def citation_index(view):
+    index = _CITATIONS.get(view.buffer_id())
+    if index is None:
+        index = _CITATIONS[view.buffer_id()] = CitationIndex(view)
+    return index
+
+
+if hasattr(sublime_plugin, 'TextChangeListener'):
+    class CiterCitationChangeListener(sublime_plugin.TextChangeListener):
+        @classmethod
+        def is_applicable(cls, buffer):
+            return True
+
+        def on_text_changed(self, changes):
+            index = _CITATIONS.get(self.buffer.id())
+            if index is not None:
+                index.edited(changes)
+
+
+def request_lint(view, delay=_LINT_DELAY):
+    """
+    Lint the citations of a view on the async thread, once no request was
+    made for `delay`, so that typing only triggers a lint once it pauses.
+    """
+    generation = _LINT_GENERATIONS.get(view.id(), 0) + 1
+    _LINT_GENERATIONS[view.id()] = generation
+    sublime.set_timeout_async(lambda: _lint(view, generation), delay)
+
+
+def _lint(view, generation):
+    if (_LINT_GENERATIONS.get(view.id()) == generation and view.is_valid() and
+            not view.settings().get('is_widget')):
+        lint_citations(view)
+
+
+def lint_citations(view):
+    """
+    Underline the citations of a view whose citekey is not in its library,
+    and show their number in the status bar. Only the lines edited since
+    the last lint are scanned again, see CitationIndex; checking the keys
+    is a dict lookup per citation, or a query to the citation server.
+
+    Runs on the async thread: only drawing the result is sent to the main
+    thread, and dropped if the view was edited meanwhile.
+    """
+    change_count = view.change_count()
+    unknown = []
+    in_scope = any(view.match_selector(0, scope) for scope in COMPLETIONS_SCOPES)
+    if LINT_CITATIONS and in_scope:
+        citations = citation_index(view).citations()
+        unknown_keys = unknown_citekeys(view, set(citekey for _, _, citekey in citations))
+        for start, end, citekey in citations:
+            if citekey in unknown_keys and _in_citation_scope(view, start):
+                unknown.append(sublime.Region(start, end))
+    sublime.set_timeout(lambda: _show_unknown(view, unknown, change_count))
+
+
+def _show_unknown(view, unknown, change_count):
+    if not view.is_valid() or view.change_count() != change_count:
+        # edited since the lint started, which requested another one
+        return
+    if unknown:
+        view.add_regions('citer_unknown', unknown, 'invalid', '',
+                         sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE |
+                         sublime.DRAW_SQUIGGLY_UNDERLINE)
+        view.set_status('citer_unknown', "Citer: {0} unknown citation{1}".format(
+            len(unknown), '' if len(unknown) == 1 else 's'))
+    else:
+        view.erase_regions('citer_unknown')
+        view.erase_status('citer_unknown')
+
+
+def unknown_citekeys(view, citekeys):
+    """The citekeys missing from the library of a view, none until it is loaded"""
+    answer = query_server(view, 'lint', citekeys=sorted(citekeys))
+    if answer is not None:
+        return set(answer.get('unknown', ()))
+    library = library_for_view(view)
+    if not library.loaded or not library.formatted_info:
+        return set()
+    return set(citekey for citekey in citekeys if citekey not in library.formatted_info)
+
+
+def _in_citation_scope(view, point):
+    return (any(view.match_selector(point, scope) for scope in COMPLETIONS_SCOPES) and
+            not any(view.match_selector(point, scope) for scope in EXCLUDED_SCOPES))
+
+
+class CiterLintEventListener(sublime_plugin.EventListener):
+    def on_load_async(self, view):
+        request_lint(view)
+
+    def on_activated_async(self, view):
+        warm_up(view)
+        request_lint(view)
+
+    def on_modified_async(self, view):
+        request_lint(view)
+
+
 def find_citation_at_point(view, point):
-    pattern = r'(?<!\w)@([^\s\.,;:?!()\[\]\{\}\'"]+)'
-    line_region = view.line(point)
-    line_text = view.substr(line_region)
-
-    for match in re.finditer(pattern, line_text):
-        start, end = match.span()
-        start_abs = line_region.begin() + start
-        end_abs = line_region.begin() + end
-        if start_abs <= point <= end_abs:
-            citekey = match.group(1)
-            if citekey in _CITEKEYS:
-                return (citekey, sublime.Region(start_abs, end_abs))
+    citation = citation_index(view).at(point)
+    if citation is not None:
+        start, end, citekey = citation
+        return (citekey, sublime.Region(start, end))
     return (None, None)
 
 
+def popup_for_view(view, citekey):
+    """The popup content of a citekey, or None if it is not in the library
+    of the view"""
+    answer = query_server(view, 'hover', citekey=citekey)
+    if answer is None:
+        return library_for_view(view).popup(citekey)
+    info = answer.get('info')
+    if info is None:
+        return None
+    return citation_popup(dict(info, entry={'abstract': info['abstract']}))
+
+
+def citation_popup(info):
+    """Build the popup content for a citation using .format()"""
+    popup_content = "<b>{0}</b>".format(info['formatted_title'])
+    if info['author'] != 'Anon':
+        popup_content += "<br><i>Author(s):</i> {0}".format(info['author'])
+    if info['year'] != 'n.d.':
+        popup_content += "<br><i>Year:</i> {0}".format(info['year'])
+    abstract = info['entry'].get('abstract')
+    if abstract:
+        abstract = abstract.replace('\n', ' ').strip()
+        popup_content += "<br><i>Abstract:</i> {0}".format(abstract)
+    return popup_content
+
+
 # An event listener for hover
 class CiterHoverEventListener(sublime_plugin.EventListener):
+    @_STATS.timed("hover")
     def on_hover(self, view, point, hover_zone):
-        if hover_zone != sublime.HOVER_TEXT:
+        if hover_zone != sublime.HOVER_TEXT or not _in_citation_scope(view, point):
             return
 
         citekey, region = find_citation_at_point(view, point)
         if citekey is None:
             return
 
-        info = _FORMATTED_INFO.get(citekey)
-        if not info:
+        content = popup_for_view(view, citekey)
+        if content is None:
             return
 
-        # Build popup content using .format()
-        popup_content = "<b>{0}</b>".format(info['formatted_title'])
-        if info['author'] != 'Anon':
-            popup_content += "<br><i>Author(s):</i> {0}".format(info['author'])
-        if info['year'] != 'n.d.':
-            popup_content += "<br><i>Year:</i> {0}".format(info['year'])
-        if info['abstract']:
-            abstract = info['abstract'].replace('\n', ' ').strip()
-            popup_content += "<br><i>Abstract:</i> {0}".format(abstract)
-
-        view.show_popup(popup_content, location=region.begin(), max_width=800, max_height=400)
+        view.show_popup(content, location=region.begin(), max_width=800, max_height=400)
 
 
 # This is for Shift+Enter
@@ -286,83 +1344,108 @@ class CiterShowCitationInfoCommand(sublime_plugin.TextCommand):
             sublime.status_message("No citation found at cursor")
             return
 
-        info = _FORMATTED_INFO.get(citekey)
-        if not info:
+        content = popup_for_view(self.view, citekey)
+        if content is None:
             sublime.status_message("No information found for citation: {0}".format(citekey))
             return
 
-        popup_content = "<b>{0}</b>".format(info['formatted_title'])
-        if info['author'] != 'Anon':
-            popup_content += "<br><i>Author(s):</i> {0}".format(info['author'])
-        if info['year'] != 'n.d.':
-            popup_content += "<br><i>Year:</i> {0}".format(info['year'])
-        if info['abstract']:
-            abstract = info['abstract'].replace('\n', ' ').strip()
-            popup_content += "<br><i>Abstract:</i> {0}".format(abstract)
-
-        self.view.show_popup(popup_content, location=region.begin(), max_width=800, max_height=400)
-
-
-# SafeDict for missing keys in formatting
-class SafeDict(dict):
-    def __missing__(self, key):
-        return '{' + key + '}'
-
-
-def _parse_authors(auth):
-    """
-    PARSE AUTHORS. Formats:
-    Single Author: Lastname
-    Two Authors: Lastname1 and Lastname2
-    Three or More Authors: Lastname1 et al.
-    """
-    try:
-        authors = auth.split(' and ')
-        lat = len(authors)
-        if lat == 1:
-            return authors[0]
-        elif lat == 2:
-            return authors[0] + " and " + authors[1]
-        else:
-            return authors[0] + " et al."
-    except Exception:
-        return auth
+        self.view.show_popup(content, location=region.begin(), max_width=800, max_height=400)
 
 
-def documents():
-    refresh_caches()
-    return _DOCUMENTS
+def _current_library(view=None):
+    if view is None:
+        view = sublime.active_window().active_view()
+    library = library_for_view(view)
+    request_reload(library)
+    return library
 
 
-def citekeys_menu():
-    refresh_caches()
-    return _MENU
+def citekeys_menu(view=None):
+    return _current_library(view).menu
 
 
-def citekeys_list():
-    refresh_caches()
-    return _CITEKEYS
+SEARCH_RESULTS_LIMIT = 500  # items sent to the quick panel
+_SEARCH_DELAY = 150  # ms, live searches wait for typing to pause
 
 
 class CiterSearchCommand(sublime_plugin.TextCommand):
+    """
+    Search the library from an input panel. The search runs while typing,
+    once typing pauses, and each query extending the previous one only
+    filters its results, so the quick panel opens at once on enter. With a
+    citation server, the server searches instead.
+    """
     current_results_list = []
 
+    @_STATS.timed("search")
     def search_keyword(self, search_term):
-        results = {}
-        for doc in documents():
-            for section_name in SEARCH_IN:
-                section_text = doc.get(section_name, "")
-                if section_text and search_term.lower() in section_text.lower():
-                    info = _FORMATTED_INFO.get(doc.get('id'))
-                    if info:
-                        results[doc.get('id')] = info['formatted_title']
-
-        self.current_results_list = list(results.values())
+        self.generation += 1
+        keys = self.matches(search_term)
+        results = []
+        for citekey in keys:
+            title = self.title(citekey)
+            if title:
+                results.append(title)
+                if len(results) == SEARCH_RESULTS_LIMIT:
+                    break
+        if self.total > len(results):
+            sublime.status_message("Citer: showing the first {0} of {1} results".format(
+                len(results), self.total))
+
+        self.current_results_list = results
         self.view.window().show_quick_panel(self.current_results_list, self._paste)
 
+    def search_live(self, search_term):
+        self.generation += 1
+        generation = self.generation
+        sublime.set_timeout(lambda: self._search_live(search_term, generation), _SEARCH_DELAY)
+
+    @_STATS.timed("live search")
+    def _search_live(self, search_term, generation):
+        if generation != self.generation:
+            return
+        keys = self.matches(search_term)
+        title = self.title(keys[0]) if keys else None
+        sublime.status_message("Citer: {0} result{1}{2}".format(
+            self.total, '' if self.total == 1 else 's', ', best: ' + title if title else ''))
+
+    def matches(self, search_term):
+        """Citekeys matching search_term, best first, narrowing the previous
+        results when search_term extends the previous query"""
+        library = self.library
+        if library is None:
+            answer = query_server(self.view, 'search', query=search_term,
+                                  limit=SEARCH_RESULTS_LIMIT) or {}
+            items = answer.get('items', [])
+            self.titles = dict((item['citekey'], item['display']) for item in items)
+            self.total = answer.get('total', len(items))
+            return [item['citekey'] for item in items]
+        if self.query is not None and self.version == library.version:
+            if search_term == self.query:
+                return self.keys
+            within = self.keys if search_term.lower().startswith(self.query.lower()) else None
+        else:
+            within = None
+        self.keys = library.search(search_term, within)
+        self.query, self.version = search_term, library.version
+        self.total = len(self.keys)
+        return self.keys
+
+    def title(self, citekey):
+        """The quick panel item of a citekey of the results"""
+        if self.library is None:
+            return self.titles.get(citekey)
+        info = self.library.formatted_info.get(citekey)
+        return info['formatted_title'] if info else None
+
     def run(self, edit):
-        refresh_settings()
-        self.view.window().show_input_panel("Cite search", "", self.search_keyword, None, None)
+        self.library = None if citation_server() else _current_library(self.view)
+        self.generation = 0
+        self.query = self.version = self.keys = None
+        self.titles = {}
+        self.total = 0
+        self.view.window().show_input_panel("Cite search", "", self.search_keyword,
+                                            self.search_live, None)
 
     def is_enabled(self):
         return True
@@ -371,10 +1454,11 @@ class CiterSearchCommand(sublime_plugin.TextCommand):
         if item == -1:
             return
         ent = self.current_results_list[item].split(' ')[0]
+        note_cited(ent)
         citekey = CITATION_FORMAT % ent
         if PANDOC_FIX:
             self.view.run_command('insert', {'characters': citekey})
-            self.view.run_command('citer_combine_citations')
+            self.view.run_command('citer_combine_citations', {'around_selections': True})
         else:
             self.view.run_command('insert', {'characters': citekey})
 
@@ -383,8 +1467,7 @@ class CiterShowKeysCommand(sublime_plugin.TextCommand):
     current_results_list = []
 
     def run(self, edit):
-        refresh_settings()
-        ctk = citekeys_menu()
+        ctk = citekeys_menu(self.view)
         if len(ctk) > 0:
             self.current_results_list = ctk
             self.view.window().show_quick_panel(self.current_results_list, self._paste)
@@ -396,10 +1479,11 @@ class CiterShowKeysCommand(sublime_plugin.TextCommand):
         if item == -1:
             return
         ent = self.current_results_list[item][0].split(' ')[0]
+        note_cited(ent)
         citekey = CITATION_FORMAT % ent
         if PANDOC_FIX:
             self.view.run_command('insert', {'characters': citekey})
-            self.view.run_command('citer_combine_citations')
+            self.view.run_command('citer_combine_citations', {'around_selections': True})
         else:
             self.view.run_command('insert', {'characters': citekey})
 
@@ -408,8 +1492,7 @@ class CiterGetTitleCommand(sublime_plugin.TextCommand):
     current_results_list = []
 
     def run(self, edit):
-        refresh_settings()
-        ctk = citekeys_menu()
+        ctk = citekeys_menu(self.view)
         if len(ctk) > 0:
             self.current_results_list = ctk
             self.view.window().show_quick_panel(self.current_results_list, self._paste)
@@ -425,47 +1508,361 @@ class CiterGetTitleCommand(sublime_plugin.TextCommand):
         self.view.run_command('insert', {'characters': title})
 
 
+def note_cited(citekey):
+    """Remember that citekey was just cited, for completions"""
+    _RECENT_CITEKEYS.pop(citekey, None)
+    _RECENT_CITEKEYS[citekey] = True
+    if len(_RECENT_CITEKEYS) > RECENT_CITEKEYS_SIZE:
+        _RECENT_CITEKEYS.popitem(last=False)
+
+
+def completion_matches(view, library, search):
+    """
+    The best MAX_COMPLETIONS citekeys matching search for a view, by match
+    quality then recency. When the search only extends the previous one in
+    the same view, the previous candidates are narrowed instead of
+    searching the whole library again.
+
+    :returns: tuple -- (citekeys, whether other citekeys matched)
+    """
+    state = (library, library.version, COMPLETION_MATCHING)
+    cached = _COMPLETIONS_CACHE.get(view.id())
+    narrow = (cached and cached[0] == state and
+              cached[2] is not None and search.startswith(cached[1]))
+    _STATS.count("completions narrowed" if narrow else "completions searched")
+
+    bonuses = recency_bonuses(_RECENT_CITEKEYS)
+    if COMPLETION_MATCHING == 'fuzzy':
+        matches, candidates = library.fuzzy_index().search(
+            search, limit=MAX_COMPLETIONS, within=cached[2] if narrow else None,
+            bonuses=bonuses)
+    else:
+        if narrow:
+            candidates = [pair for pair in cached[2] if pair[0].startswith(search)]
+            candidates += [pair for pair in cached[2]
+                           if search in pair[0] and not pair[0].startswith(search)]
+        else:
+            candidates = library.complete(search)
+        matches = best_citekey_matches(candidates, search, MAX_COMPLETIONS, bonuses)
+    _COMPLETIONS_CACHE[view.id()] = (state, search, candidates)
+    return matches, candidates is None or len(candidates) > len(matches)
+
+
 class CiterCompleteCitationEventListener(sublime_plugin.EventListener):
+    @_STATS.timed("completions")
     def on_query_completions(self, view, prefix, loc):
         in_scope = any(view.match_selector(loc[0], scope) for scope in COMPLETIONS_SCOPES)
         ex_scope = any(view.match_selector(loc[0], scope) for scope in EXCLUDED_SCOPES)
 
         if ENABLE_COMPLETIONS and in_scope and not ex_scope:
-            load_yamlbib_path(view)
-
             search = prefix.replace('@', '').lower()
             results = []
-            
-            print("COMPLETION_TYPE", COMPLETION_TYPE)
-            for key, info in _FORMATTED_INFO.items():
-                if search in key.lower():
-                    display_text = info['formatted_title']
-                    
-                    # Determine what to insert based on completion_type setting
-                    if COMPLETION_TYPE == 'citekey':
-                        # Insert only the formatted citation key
-                        insert_text = CITATION_FORMAT % key
-                    elif COMPLETION_TYPE == 'title':
-                        # Insert only the title
-                        insert_text = info['title']
-                    elif COMPLETION_TYPE == 'both':
-                        # Insert both citation key and title
-                        formatted_key = CITATION_FORMAT % key
-                        insert_text = "{0} {1}".format(formatted_key, info['title'])
-                    else:
-                        # Default fallback to citekey
-                        insert_text = CITATION_FORMAT % key
-                    
-                    results.append([display_text, insert_text])
+
+            answer = query_server(view, 'complete', prefix=search, limit=MAX_COMPLETIONS,
+                                  recent=list(reversed(_RECENT_CITEKEYS)),
+                                  matching=COMPLETION_MATCHING)
+            if answer is None:
+                library = library_for_view(view)
+                formatted_info = library.formatted_info
+                matches, truncated = completion_matches(view, library, search)
+                matches = [(key, formatted_info[key]['formatted_title'], formatted_info[key]['title'])
+                           for key in matches if key in formatted_info]
+            else:
+                matches = [(item['citekey'], item['display'], item['title'])
+                           for item in answer.get('items', ())]
+                truncated = answer.get('truncated', False)
+            if truncated:
+                sublime.status_message("Citer: showing the best {0} matches, type more to narrow".format(
+                    len(matches)))
+
+            for key, display_text, title in matches:
+                # Determine what to insert based on completion_type setting
+                if COMPLETION_TYPE == 'citekey':
+                    # Insert only the formatted citation key
+                    insert_text = CITATION_FORMAT % key
+                elif COMPLETION_TYPE == 'title':
+                    # Insert only the title
+                    insert_text = title
+                elif COMPLETION_TYPE == 'both':
+                    # Insert both citation key and title
+                    formatted_key = CITATION_FORMAT % key
+                    insert_text = "{0} {1}".format(formatted_key, title)
+                else:
+                    # Default fallback to citekey
+                    insert_text = CITATION_FORMAT % key
+
+                results.append([display_text, insert_text])
 
             if EXCLUDE and len(results) > 0:
                 return (results, sublime.INHIBIT_WORD_COMPLETIONS)
             return results
 
+    def on_post_text_command(self, view, command_name, args):
+        if command_name in ('commit_completion', 'insert_best_completion'):
+            sel = view.sel()
+            if not len(sel) or not _in_citation_scope(view, sel[0].begin()):
+                return
+            citation = citation_index(view).at(sel[0].begin())
+            if citation is not None:
+                note_cited(citation[2])
+
+    def on_close(self, view):
+        release_view(view)
+
+
+class CiterProjectEventListener(sublime_plugin.EventListener):
+    """
+    Forget the bib files and library settings of a window when its project
+    changes, and read the other settings from the project of the focused
+    window
+    """
+
+    def on_load_project(self, window):
+        _forget_window(window)
+        settings_changed()
+
+    def on_post_save_project(self, window):
+        _forget_window(window)
+        settings_changed()
+
+    def on_activated(self, view):
+        window = view.window()
+        if window is not None and window.id() != _SETTINGS_WINDOW:
+            # libraries keep the settings of their own window, so this
+            # reloads nothing
+            refresh_settings()
+
+    def on_pre_close_window(self, window):
+        _forget_window(window)
+
+
+def _forget_window(window):
+    _WINDOW_BIBPATHS.pop(window.id(), None)
+    _WINDOW_SETTINGS.pop(window.id(), None)
+
+
+def performance_report():
+    """The performance stats, followed by the open libraries and the pool"""
+    lines = [_STATS.report(), "{0:<40} {1:>8} {2:>8}".format("open library", "entries", "views")]
+    for library in list(_LIBRARIES.values()):
+        lines.append("{0:<40} {1:>8} {2:>8}".format(
+            ', '.join(os.path.basename(path) for path in library.paths) or 'no bib file',
+            len(library.entries), len(library.views)))
+    with _BIBFILES.lock:
+        sizes = [bibfile.size for bibfile in _BIBFILES.bibfiles.values()]
+    lines.append("\n{0} bib files parsed, {1:.1f} of {2:.0f} MB".format(
+        len(sizes), sum(sizes) / 2.0 ** 20, _BIBFILES.budget / 2.0 ** 20))
+    return '\n'.join(lines) + '\n'
+
+
+def show_report(window, name, report):
+    """Show a report in a new read-only scratch view"""
+    view = window.new_file()
+    view.set_name(name)
+    view.set_scratch(True)
+    view.run_command('append', {'characters': report})
+    view.set_read_only(True)
+
+
+class CiterShowPerformanceStatsCommand(sublime_plugin.WindowCommand):
+    """Show the performance stats in a scratch view"""
+    def run(self):
+        show_report(self.window, "Citer Performance Stats", performance_report())
+
+
+# Objects that belong to the code rather than the data
+_NOT_DATA = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+             types.MethodType)
+
+
+def deep_size(obj, seen):
+    """
+    Bytes taken by obj and the objects it refers to, except those whose id
+    is in seen. The ids of the objects counted are added to seen, so that
+    objects shared by several structures are only counted once.
+    """
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _NOT_DATA):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return total
+
+
+# Structures of the libraries, as (attribute, name in memory_usage)
+_LIBRARY_STRUCTURES = [
+    ('entries', 'entries'),
+    ('documents', 'documents'),
+    ('citekeys', 'citekeys'),
+    ('formatted_info', 'formatted info'),
+    ('menu', 'menu'),
+    ('completion_keys', 'completion keys'),
+    ('popups', 'popups'),
+    ('word_index', 'word index'),
+    ('search_trigrams', 'search trigrams'),
+    ('key_trigrams', 'citekey trigrams'),
+    ('_fuzzy_index', 'fuzzy index'),
+]
+
+
+def _snapshot_of(bibfile):
+    """The snapshot the entries of a bib file are read from, or None"""
+    entries = bibfile.entries
+    if entries and not isinstance(entries[0], dict):
+        return getattr(entries[0], 'snapshot', None)
+    return None
+
+
+def memory_usage():
+    """
+    The memory taken by Citer's data, per structure and per field of the
+    entries. The entries are first counted with the bib files holding
+    them, so the structures of the libraries only count what they add.
+
+    Entries loaded from a snapshot only hold their position in the
+    memory-mapped file: the objects are counted as "snapshot entries",
+    the values with the size of the mapped snapshots, and the size of the
+    fields is read from the snapshots.
+
+    :returns: tuple -- (list of (structure, bytes), list of (field, bytes)
+    sorted by size, bytes of the mapped snapshots)
+    """
+    seen = set()
+    with _BIBFILES.lock:
+        bibfiles = list(_BIBFILES.bibfiles.values())
+    libraries = list(_LIBRARIES.values())
+    snapshots = [(bibfile, _snapshot_of(bibfile)) for bibfile in bibfiles]
+    structures = [
+        ('bib file entries', sum(deep_size(bibfile.entries, seen)
+                                 for bibfile, snapshot in snapshots if snapshot is None)),
+        # not followed to the snapshot, whose values are mapped
+        ('snapshot entries', sum(deep_size(bibfile.entries, seen)
+                                 for bibfile, snapshot in snapshots if snapshot is not None)),
+    ]
+    for attribute, name in _LIBRARY_STRUCTURES:
+        structures.append((name, sum(deep_size(getattr(library, attribute), seen)
+                                     for library in libraries)))
+    structures += [
+        ('papers', deep_size(_PAPERS, seen)),
+        ('citation indexes', deep_size(_CITATIONS, seen)),
+        ('completion caches', deep_size(_COMPLETIONS_CACHE, seen)),
+    ]
+    latexenc = sys.modules.get('bibtexparser.latexenc')
+    if latexenc is not None:
+        structures.append(('latexenc tables', deep_size(
+            [latexenc.unicode_to_latex, latexenc.unicode_to_latex_map,
+             latexenc.unicode_to_crappy_latex1, latexenc.unicode_to_crappy_latex2], seen)))
+
+    fields = collections.Counter()
+    mapped = 0
+    seen = set()
+    for bibfile, snapshot in snapshots:
+        if snapshot is not None:
+            mapped += snapshot.mapped_size
+            fields.update(snapshot.field_sizes())
+            continue
+        # values held by the entries, so that their ids are not reused
+        for doc in bibfile.entries:
+            for field, value in doc.items():
+                fields[field] += deep_size(value, seen)
+    return structures, fields.most_common(), mapped
+
+
+def trace_reload(limit=20):
+    """
+    Reload all the bib files of the open libraries under tracemalloc.
+
+    :returns: list -- the limit lines of code whose allocations grew the
+    most across the reload, empty if tracemalloc is not available
+    """
+    if tracemalloc is None:
+        return []
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for library in list(_LIBRARIES.values()):
+            for bibfile in library.bibfiles:
+                bibfile.loaded = False
+            library.refresh()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return [str(stat) for stat in after.compare_to(before, 'lineno')[:limit]]
+
+
+def memory_report(trace=False):
+    """The memory usage as text, with the allocations of a reload if trace"""
+    structures, fields, mapped = memory_usage()
+    lines = ["Citer memory usage, objects shared by several structures are "
+             "counted in the first one", ""]
+    lines.append("{0:<40} {1:>10}".format("structure", "KB"))
+    lines += ["{0:<40} {1:>10.1f}".format(name, size / 1024.0) for name, size in structures]
+    lines.append("{0:<40} {1:>10.1f}".format("total", sum(size for _, size in structures) / 1024.0))
+    lines.append("{0:<40} {1:>10.1f}".format("memory-mapped snapshots", mapped / 1024.0))
+    lines += ["", "{0:<40} {1:>10}".format("entry field", "KB")]
+    lines += ["{0:<40} {1:>10.1f}".format(name, size / 1024.0) for name, size in fields]
+    if trace:
+        lines += ["", "Allocations grown by reloading the bib files"]
+        lines += trace_reload() or ["tracemalloc is not available in this Python"]
+    return '\n'.join(lines) + '\n'
+
+
+class CiterShowMemoryReportCommand(sublime_plugin.WindowCommand):
+    """
+    Show the memory usage in a scratch view. With trace, the bib files are
+    also reloaded under tracemalloc. The report is made on the async thread,
+    where reloads run, so that the libraries do not change meanwhile.
+    """
+    def run(self, trace=False):
+        window = self.window
+
+        def report():
+            text = memory_report(trace)
+            sublime.set_timeout(lambda: show_report(window, "Citer Memory Report", text))
+
+        sublime.set_timeout_async(report)
+
+
+# Two or more adjacent brackets, each holding a citation
+_CITATION_GROUP = re.compile(r'(?:\[[^\[\]\n]*@[^\[\]\n]*\]){2,}')
+
+
+def citation_groups(text, offset=0):
+    """Regions of adjacent citation brackets in text, which starts at offset"""
+    return [(offset + match.start(), offset + match.end())
+            for match in _CITATION_GROUP.finditer(text)]
+
 
 class CiterCombineCitationsCommand(sublime_plugin.TextCommand):
-    def run(self, edit):
-        refresh_settings()
-        lstpos = self.view.find_all(r'\]\[')
-        for i, pos in reversed(list(enumerate(lstpos))):
-            self.view.replace(edit, pos, r'; ')
+    """
+    Merge adjacent citations: [@Fred2000][@Mary2001] becomes
+    [@Fred2000; @Mary2001]. With around_selections, only the citations
+    around each selection are merged, otherwise those of the whole document.
+    """
+    def run(self, edit, around_selections=False):
+        if around_selections:
+            groups = set()
+            for sel in self.view.sel():
+                line = self.view.line(sel)
+                for begin, end in citation_groups(self.view.substr(line), line.begin()):
+                    if begin <= sel.begin() and sel.end() <= end:
+                        groups.add((begin, end))
+        else:
+            groups = citation_groups(self.view.substr(sublime.Region(0, self.view.size())))
+
+        for begin, end in sorted(groups, reverse=True):
+            region = sublime.Region(begin, end)
+            self.view.replace(edit, region, self.view.substr(region).replace('][', '; '))
@@ -0,0 +1,75 @@
+"""
+Citation server
+
+A process owning parsed bib files, so that Citer can answer completions,
+searches, hovers and lints without parsing and indexing large libraries in
+Sublime's shared plugin host. It only depends on bibtexparser, not on
+Sublime, and runs with any Python 3 interpreter:
+
+    python -m citerserver [--poll SECONDS]
+
+Protocol
+--------
+
+JSON-RPC 2.0 over stdin and stdout, one message per line (each message is
+a JSON object without raw newlines, encoded in utf-8). Requests are
+answered in order. A request without id is a notification and gets no
+response.
+
+The libraries are identified by the list of their bib file paths, given
+with each request (`paths`), and by the settings they are displayed and
+searched with: those of `initialize`, unless a request gives its own
+(`settings`, an object with `quickview_format` and `search_fields`, both
+optional), as Citer does for windows whose project overrides them. A library is loaded in the background the
+first time it is named, and its files are polled for changes every
+`--poll` seconds (default 1) and reloaded when they change. Until it is
+loaded, queries about it answer at once with `"loading": true` and empty
+results. An entry of a file replaces the entries with the same citekey in
+the files before it.
+
+Methods:
+
+* `initialize` {quickview_format, search_fields}: how entries are
+  displayed (a Python format string with `citekey`, `title`, `author` and
+  `year`) and which fields `search` looks in. Returns {"version"}.
+* `open` {paths}: start loading a library. Returns {"loading"}.
+* `complete` {paths, prefix, limit, recent, matching}: the best citekeys
+  for prefix (case insensitive), matched and ranked as Citer's own
+  completions with the same `matching` setting. With "fuzzy" (the
+  default), prefix is matched as a subsequence of the citekey, first
+  author surname and year, or as the start of a word of the title; with
+  any other value, citekeys containing prefix are listed, those starting
+  with it first. Recently cited citekeys (`recent`, most recent first)
+  rank higher. Returns {"loading", "items": [{"citekey", "display",
+  "title"}], "truncated"}.
+* `search` {paths, query, limit}: entries with a search field containing
+  query (case insensitive), ranked by the relevance (BM25) of their words
+  to those of the query. Returns {"loading", "items": [{"citekey",
+  "display"}], "total"}.
+* `hover` {paths, citekey}: the entry of a citekey. Returns {"loading",
+  "info": {"formatted_title", "title", "author", "year", "abstract"} or
+  null}.
+* `lint` {paths, citekeys}: the citekeys that are not in the library.
+  Returns {"loading", "unknown"}.
+* `shutdown`: returns null, then the server exits. It also exits at the
+  end of its input.
+
+Errors are JSON-RPC errors: -32700 (parse error), -32600 (invalid
+request), -32601 (unknown method), -32602 (invalid params) and -32603
+(internal error).
+
+The entries are formatted, matched and ranked by :mod:`citerserver.index`,
+the module Citer itself uses, so results are the same with or without the
+server.
+
+Example session, with a local client (see :mod:`citerserver.client`):
+
+>>> from citerserver.client import Client
+>>> client = Client(['python', '-m', 'citerserver'])
+>>> client.request('complete', {'paths': ['library.bib'], 'prefix': 'smi'})
+{'loading': True, 'items': [], 'truncated': False}
+>>> client.close()
+
+"""
+__all__ = ['library', 'server', 'client']
+__version__ = '1.0'
@@ -0,0 +1,5 @@
+import sys
+
+from citerserver.server import main
+
+sys.exit(main())
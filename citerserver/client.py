@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A client of the citation server, used by Citer and usable on its own to
+drive a server, e.g. in tests:
+
+>>> from citerserver.client import Client
+>>> with Client([sys.executable, '-m', 'citerserver']) as client:
+...     client.request('lint', {'paths': ['library.bib'], 'citekeys': ['Doe2020']})
+
+"""
+
+import json
+import os
+import subprocess
+import threading
+
+__all__ = ['ServerError', 'ServerTimeout', 'Client']
+
+
+class ServerError(Exception):
+    """An error answered by the server, or the server exited"""
+    def __init__(self, message, code=None):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class ServerTimeout(ServerError):
+    """The server did not answer in time"""
+
+
+class Client(object):
+    """
+    Start a server and send it requests. Requests can be sent from several
+    threads; each waits for its own response.
+
+    :param command: the command starting the server, a list
+    :param cwd: the directory to start it in
+    """
+
+    def __init__(self, command, cwd=None):
+        startupinfo = None
+        if os.name == 'nt':
+            # no console window for the server
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        self.process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, startupinfo=startupinfo)
+        self.lock = threading.Lock()
+        self.answered = False  # whether the server ever answered
+        self.exited = False  # set as soon as its output or input is closed
+        self.next_id = 0
+        self.pending = {}  # request id -> [event, response]
+        self.reader = threading.Thread(target=self._read)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def alive(self):
+        return not self.exited and self.process.poll() is None
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                response = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            self.answered = True
+            with self.lock:
+                waiting = self.pending.pop(response.get('id'), None)
+            if waiting is not None:
+                # otherwise the request timed out, and nobody waits anymore
+                waiting[1] = response
+                waiting[0].set()
+        with self.lock:
+            self.exited = True
+            pending, self.pending = self.pending, {}
+        for waiting in pending.values():
+            waiting[0].set()
+
+    def _send(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        try:
+            with self.lock:
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+        except (IOError, OSError, ValueError):
+            self.exited = True
+            raise ServerError('The citation server exited')
+
+    def request(self, method, params=None, timeout=None):
+        """
+        Send a request and wait for its result.
+
+        :param timeout: seconds to wait at most, forever if None
+        :returns: the result
+        :raises: ServerTimeout if there was no answer in time, ServerError
+        if the server answered with an error or exited
+        """
+        waiting = [threading.Event(), None]
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            self.pending[request_id] = waiting
+        self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method,
+                    'params': params or {}})
+        if not waiting[0].wait(timeout):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise ServerTimeout('No answer to %s in %.3f s' % (method, timeout))
+        response = waiting[1]
+        if response is None:
+            raise ServerError('The citation server exited')
+        if 'error' in response:
+            raise ServerError(response['error'].get('message'), response['error'].get('code'))
+        return response.get('result')
+
+    def notify(self, method, params=None):
+        """Send a notification, which gets no answer"""
+        self._send({'jsonrpc': '2.0', 'method': method, 'params': params or {}})
+
+    def close(self, timeout=1.0):
+        """Ask the server to exit, and kill it if it does not"""
+        if self.process.poll() is None:
+            try:
+                self.notify('shutdown')
+                self.process.stdin.close()
+            except (ServerError, IOError, OSError):
+                pass
+            timer = threading.Timer(timeout, self._kill)
+            timer.start()
+            self.process.wait()
+            timer.cancel()
+        self.process.stdout.close()
+
+    def _kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
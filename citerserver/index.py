@@ -0,0 +1,496 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+How Citer displays, matches and searches entries: the formatting of an
+entry and the fuzzy, word and trigram indexes built over a library. Both
+the plugin and the citation server use them, so this module depends on
+neither Sublime nor bibtexparser.
+"""
+
+import bisect
+import heapq
+import itertools
+import math
+import re
+import string
+from array import array
+
+__all__ = ['SafeDict', 'parse_authors', 'first_surname', 'entry_fingerprint',
+           'format_entry', 'FUZZY_SEPARATOR', 'fuzzy_score', 'FuzzyIndex',
+           'RECENCY_BONUS', 'recency_bonuses', 'tokenize', 'WordIndex', 'TrigramIndex',
+           'citekey_matches', 'best_citekey_matches', 'containing']
+
+
+def entry_fingerprint(doc):
+    """A hash of all the fields of an entry, to tell if it changed"""
+    return hash(tuple(sorted(doc.items())))
+
+
+# SafeDict for missing keys in formatting
+class SafeDict(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def parse_authors(auth):
+    """
+    PARSE AUTHORS. Formats:
+    Single Author: Lastname
+    Two Authors: Lastname1 and Lastname2
+    Three or More Authors: Lastname1 et al.
+    """
+    try:
+        authors = auth.split(' and ')
+        lat = len(authors)
+        if lat == 1:
+            return authors[0]
+        elif lat == 2:
+            return authors[0] + " and " + authors[1]
+        else:
+            return authors[0] + " et al."
+    except Exception:
+        return auth
+
+
+def first_surname(auth):
+    """Surname of the first author, written either Last, First or First Last"""
+    first = auth.split(' and ')[0].strip()
+    if ',' in first:
+        return first.split(',')[0].strip()
+    return first.split(' ')[-1] if first else ''
+
+
+def format_entry(doc, quickview_format):
+    """Build the info shown in menus and popups for an entry"""
+    citekey = doc.get('id', 'Unknown')
+    title = doc.get('title', 'No Title').replace('{', '').replace('}', '')
+    year = doc.get('year', 'n.d.')
+
+    if doc.get('author') is not None:
+        auths = parse_authors(doc.get('author'))
+    else:
+        auths = 'Anon'
+
+    formatted_title = string.Formatter().vformat(quickview_format, (), SafeDict(
+        citekey=citekey,
+        title=title,
+        author=auths,
+        year=year
+    ))
+
+    # What fuzzy completion matches against
+    match_key = FUZZY_SEPARATOR.join([
+        citekey, first_surname(doc.get('author', '')), year, title]).lower()
+
+    # Store full info for popup, the abstract is only read from the
+    # entry when a popup is shown
+    return {
+        'title': title,
+        'author': auths,
+        'year': year,
+        'entry': doc,
+        'formatted_title': formatted_title,
+        'match_key': match_key.replace('\n', ' ')
+    }
+
+
+FUZZY_SEPARATOR = '\x1f'
+_WORD_BOUNDARIES = frozenset(FUZZY_SEPARATOR + ' -_:./')
+_NON_WORD = re.compile(r'\W+')
+
+
+def fuzzy_score(query, text):
+    """
+    Score a subsequence match of query in a match key, higher is better.
+    Contiguous matches, matches at the start of a word and matches early
+    in the key (the citekey comes first) get a bonus.
+
+    :returns: int -- score, or None if query is not a subsequence of text
+    """
+    index = text.find(query)
+    if index >= 0:
+        score = 100 + 10 * len(query)
+        if index == 0:
+            score += 100
+        elif text[index - 1] in _WORD_BOUNDARIES:
+            score += 50
+        return score - index // 4 - len(text) // 32
+
+    score = 0
+    position = 0
+    previous = -2
+    first = None
+    for char in query:
+        index = text.find(char, position)
+        if index < 0:
+            return None
+        if first is None:
+            first = index
+        if index == previous + 1:
+            score += 8
+        elif index == 0 or text[index - 1] in _WORD_BOUNDARIES:
+            score += 6
+        else:
+            score -= min(index - position, 4)
+        previous = index
+        position = index + 1
+    return score - first // 4 - len(text) // 32
+
+
+class FuzzyIndex:
+    """
+    Ranked fuzzy matching over the match keys of a library.
+
+    An entry matches when the query is a subsequence of its citekey, first
+    author surname and year, or when a word of its title starts with the
+    query. The match keys are joined in one string per kind, one entry per
+    line, so that candidates are found by a single regex scan and only
+    those are scored in Python. When enough citekeys start with the query
+    the scan is skipped altogether, since nothing can rank above them.
+    """
+
+    def __init__(self, formatted_info):
+        self.keys = list(formatted_info)
+        self.texts = [formatted_info[key]['match_key'] for key in self.keys]
+        self.short = []
+        self.titles = []
+        for text in self.texts:
+            parts = text.split(FUZZY_SEPARATOR, 3)
+            self.short.append(FUZZY_SEPARATOR.join(parts[:3]))
+            # each title word is preceded by a single space, so that words
+            # starting with the query are found by a plain literal search
+            title = parts[3] if len(parts) > 3 else ''
+            self.titles.append(' ' + _NON_WORD.sub(' ', title))
+        # match keys start with the citekey
+        self.prefixes = sorted(zip(self.short, range(len(self.keys))))
+        self.short_haystack, self.short_starts = self._join(self.short)
+        self.title_haystack, self.title_starts = self._join(self.titles)
+
+    @staticmethod
+    def _join(lines):
+        starts = [0]
+        starts += itertools.accumulate(len(line) + 1 for line in lines)
+        return '\n'.join(lines), starts
+
+    @staticmethod
+    def pattern(query):
+        """
+        A regex matching the rest of a line that contains query as a
+        subsequence. Each character class stops at the next query character,
+        so matching never backtracks.
+        """
+        parts = [re.escape(query[0])]
+        for char in query[1:]:
+            char = re.escape(char)
+            parts.append('[^{0}\\n]*{0}'.format(char))
+        parts.append('[^\\n]*')
+        return re.compile(''.join(parts))
+
+    def candidates(self, query, within=None):
+        """Indices of the entries matching query, optionally among a
+        previous list of candidates"""
+        subsequence = self.pattern(query)
+        word = ' ' + query
+        if within is not None:
+            return [i for i in within
+                    if subsequence.search(self.short[i]) or word in self.titles[i]]
+
+        starts = self.short_starts
+        found = set(bisect.bisect_right(starts, match.start()) - 1
+                    for match in subsequence.finditer(self.short_haystack))
+        # str.find is much faster than a regex for the literal title search
+        haystack = self.title_haystack
+        starts = self.title_starts
+        position = haystack.find(word)
+        while position >= 0:
+            line = bisect.bisect_right(starts, position) - 1
+            found.add(line)
+            position = haystack.find(word, starts[line + 1] if line + 1 < len(starts) else len(haystack))
+        return sorted(found)
+
+    def _rank(self, query, indices, limit, bonuses=None):
+        texts = self.texts
+        keys = self.keys
+        if bonuses:
+            scored = ((fuzzy_score(query, texts[i]) + bonuses.get(keys[i], 0), -i)
+                      for i in indices)
+        else:
+            scored = ((fuzzy_score(query, texts[i]), -i) for i in indices)
+        if limit is None:
+            ranked = sorted(scored, reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, scored)
+        return [keys[-i] for _, i in ranked]
+
+    def search(self, query, limit=None, within=None, bonuses=None):
+        """
+        Rank the entries matching query.
+
+        :param limit: return at most this many results, selected with a heap
+        :param within: only consider these candidates
+        :param bonuses: dict of citekey -> score added to its matches
+        :returns: tuple -- (ranked citekeys, candidate indices or None if
+        the candidates were not all collected)
+        """
+        if not query:
+            candidates = list(range(len(self.keys))) if within is None else within
+            if bonuses:
+                # an empty query matches everything equally
+                scored = ((bonuses.get(self.keys[i], 0), -i) for i in candidates)
+                ranked = heapq.nlargest(limit or len(candidates), scored)
+                return [self.keys[-i] for _, i in ranked], candidates
+            keys = [self.keys[i] for i in candidates[:limit]]
+            return keys, candidates
+
+        if limit is not None and within is None:
+            start = bisect.bisect_left(self.prefixes, (query,))
+            end = bisect.bisect_left(self.prefixes, (query + '\U0010ffff',), start)
+            if end - start >= limit:
+                hits = [i for _, i in self.prefixes[start:end]]
+                return self._rank(query, hits, limit, bonuses), None
+
+        candidates = self.candidates(query, within)
+        return self._rank(query, candidates, limit, bonuses), candidates
+
+
+RECENCY_BONUS = 30  # completion score of the most recent, less than a prefix match
+
+
+def recency_bonuses(recent):
+    """Completion score bonus of the recently cited citekeys, the largest
+    for the most recent one
+
+    :param recent: citekeys, most recent last
+    """
+    count = len(recent)
+    return dict((key, RECENCY_BONUS * (rank + 1) // count)
+                for rank, key in enumerate(recent))
+
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text in lowercase words"""
+    return _WORD.findall(text.lower())
+
+
+class WordIndex:
+    """
+    Inverted index of the words in the search fields of each entry. Queries
+    match entries containing all their words, ranked with BM25.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, fields, entries=None):
+        self.fields = list(fields)
+        self.postings = {}  # word -> {citekey: term frequency}
+        self.lengths = {}  # citekey -> number of words
+        self.total_length = 0
+        for key, doc in (entries or {}).items():
+            self.add(key, doc)
+
+    def words(self, doc):
+        words = []
+        for field in self.fields:
+            value = doc.get(field)
+            if value:
+                words += tokenize(value)
+        return words
+
+    def add(self, key, doc):
+        counts = {}
+        for word in self.words(doc):
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            self.postings.setdefault(word, {})[key] = count
+        self.lengths[key] = length = sum(counts.values())
+        self.total_length += length
+
+    def remove(self, key, doc):
+        """Remove an entry, doc must be the entry as it was added"""
+        for word in set(self.words(doc)):
+            posting = self.postings.get(word)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[word]
+        self.total_length -= self.lengths.pop(key, 0)
+
+    def rank(self, query, keys):
+        """
+        Order entries by BM25 relevance to the words of query. Entries that
+        contain none of them keep their order, after the others.
+
+        :returns: list -- citekeys, most relevant first
+        """
+        postings = [posting for posting in
+                    (self.postings.get(word) for word in set(tokenize(query)))
+                    if posting is not None]
+        count = len(self.lengths)
+        average = float(self.total_length) / count if count else 1.0
+        weights = [(posting, math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5)))
+                   for posting in postings]
+        scores = {}
+        for key in keys:
+            norm = self.K1 * (1 - self.B + self.B * self.lengths.get(key, 0) / average)
+            scores[key] = sum(idf * posting[key] * (self.K1 + 1) / (posting[key] + norm)
+                              for posting, idf in weights if key in posting)
+        return sorted(keys, key=lambda key: -scores[key])
+
+
+class TrigramIndex:
+    """
+    Index of the three character substrings of some fields of each entry.
+
+    An entry whose field contains a query of three characters or more has
+    all of the query's trigrams, so intersecting their postings gives a
+    small superset of the matches. Only those candidates then need the
+    plain substring test. Removed entries are only forgotten by the key
+    table; their ids linger in the postings until the index is rebuilt.
+
+    Values longer than LONG_VALUE (typically abstracts) would cost more to
+    split in trigrams than they save. They are instead joined in a single
+    lowercase string, where str.find locates exact matches directly.
+    """
+    LONG_VALUE = 256
+
+    def __init__(self, fields, entries=None):
+        self.fields = list(fields)
+        self.postings = {}  # trigram -> increasing array of entry ids
+        self.ids = {}  # citekey -> entry id
+        self.keys = []  # entry id -> citekey, None once removed
+        self.long_values = []  # entry id -> lowercase long values
+        self.removed = 0
+        self._haystack = None
+        for key, doc in (entries or {}).items():
+            self.add(key, doc)
+        self.prepare()
+
+    def add(self, key, doc):
+        self.remove(key)
+        entry_id = self.ids[key] = len(self.keys)
+        self.keys.append(key)
+        trigrams = set()
+        long_values = []
+        for field in self.fields:
+            value = doc.get(field)
+            if value:
+                value = value.lower()
+                if len(value) > self.LONG_VALUE:
+                    long_values.append(value)
+                else:
+                    trigrams.update(value[i:i + 3] for i in range(len(value) - 2))
+        self.long_values.append('\n'.join(long_values))
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting is None:
+                posting = self.postings[trigram] = array('I')
+            posting.append(entry_id)
+        self._haystack = None
+
+    def remove(self, key):
+        entry_id = self.ids.pop(key, None)
+        if entry_id is not None:
+            self.keys[entry_id] = None
+            self.long_values[entry_id] = ''
+            self.removed += 1
+            self._haystack = None
+
+    def prepare(self):
+        """Join the long values, once done adding and removing entries"""
+        if self._haystack is None:
+            starts = [0]
+            starts += itertools.accumulate(len(value) + 1 for value in self.long_values)
+            self._haystack = ('\n'.join(self.long_values), starts)
+
+    def candidates(self, query):
+        """
+        Citekeys of the entries that may contain query, to be checked.
+
+        :returns: list -- citekeys, or None if query is too short to narrow
+        the search
+        """
+        query = query.lower()
+        if len(query) < 3:
+            return None
+        postings = []
+        for trigram in set(query[i:i + 3] for i in range(len(query) - 2)):
+            posting = self.postings.get(trigram)
+            if posting is None:
+                postings = []
+                break
+            postings.append(posting)
+
+        ids = set()
+        if postings:
+            postings.sort(key=len)
+            ids.update(postings[0])
+            for posting in postings[1:]:
+                if len(ids) <= 32:
+                    # few enough to check them directly
+                    break
+                ids.intersection_update(posting)
+
+        self.prepare()
+        haystack, starts = self._haystack
+        position = haystack.find(query)
+        while position >= 0:
+            entry_id = bisect.bisect_right(starts, position) - 1
+            ids.add(entry_id)
+            position = haystack.find(query, starts[entry_id + 1])
+
+        keys = self.keys
+        return [keys[i] for i in sorted(ids) if keys[i] is not None]
+
+
+def citekey_matches(completion_keys, candidates, search):
+    """
+    The citekeys containing a lowercase search: first those starting with
+    it, found by bisection, then the others, in order.
+
+    :param completion_keys: sorted (lowercase key, key) pairs of all the
+    citekeys
+    :param candidates: citekeys that may contain search, from a citekey
+    TrigramIndex, or None to check them all
+    :returns: list -- (lowercase key, key) pairs
+    """
+    keys = completion_keys
+    start = bisect.bisect_left(keys, (search,))
+    end = bisect.bisect_left(keys, (search + '\U0010ffff',), start)
+    matches = keys[start:end]
+    if candidates is None:
+        matches += [pair for pair in keys[:start] if search in pair[0]]
+        matches += [pair for pair in keys[end:] if search in pair[0]]
+    else:
+        pairs = ((key.lower(), key) for key in candidates)
+        matches += sorted(pair for pair in pairs
+                          if search in pair[0] and not pair[0].startswith(search))
+    return matches
+
+
+def best_citekey_matches(matches, search, limit, bonuses):
+    """The best limit citekeys of the (lowercase key, key) pairs matching
+    search: those starting with it first, then the recently cited ones,
+    in order"""
+    best = heapq.nsmallest(limit, range(len(matches)), key=lambda i: (
+        not matches[i][0].startswith(search), -bonuses.get(matches[i][1], 0), i))
+    return [matches[i][1] for i in best]
+
+
+def containing(entries, fields, term, candidates):
+    """Citekeys of the candidates with one of fields containing a lowercase
+    term, in order"""
+    results = []
+    for key in candidates:
+        doc = entries.get(key)
+        if doc is None:
+            continue
+        for field in fields:
+            text = doc.get(field, "")
+            if text and term in text.lower():
+                results.append(key)
+                break
+    return results
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The libraries hosted by the citation server: the entries of a list of bib
+files, reloaded when one of them changes, and the queries Citer makes.
+"""
+
+import os
+import threading
+
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.customization import convert_to_unicode
+
+from citerserver.index import (format_entry, FuzzyIndex, WordIndex, TrigramIndex,
+                               recency_bonuses, citekey_matches, best_citekey_matches,
+                               containing)
+
+__all__ = ['Formatter', 'Library']
+
+
+class Formatter(object):
+    """How entries are displayed and searched, set by `initialize`"""
+
+    def __init__(self, quickview_format='{citekey} - {title}',
+                 search_fields=('author', 'title', 'year', 'id', 'abstract')):
+        self.quickview_format = quickview_format
+        self.search_fields = list(search_fields)
+
+    def format(self, doc):
+        """The info shown for an entry, as Citer formats it"""
+        return format_entry(doc, self.quickview_format)
+
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as bibfile:
+        return BibTexParser(bibfile.read(), customization=convert_to_unicode,
+                            ignore_nonstandard_types=False).get_entry_list()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Library(object):
+    """
+    The entries of a list of bib files, indexed as Citer indexes them. The
+    entries and indexes are replaced rather than modified on reload, so
+    that queries can read them while a file is reloaded in another thread.
+    """
+
+    def __init__(self, paths, formatter):
+        self.paths = list(paths)
+        self.formatter = formatter
+        self.mtimes = None
+        self.loaded = False
+        self.error = None
+        self.citekeys = []  # in library order, later files win
+        self.entries = {}  # citekey -> entry
+        self.formatted_info = {}  # citekey -> format_entry of the entry
+        self.completion_keys = []  # sorted (lowercase key, key) pairs
+        self.fuzzy_index = FuzzyIndex({})
+        self.key_trigrams = TrigramIndex(['id'])
+        self.search_trigrams = TrigramIndex(formatter.search_fields)
+        self.word_index = WordIndex(formatter.search_fields)
+        self.lock = threading.Lock()  # held while loading
+
+    def changed(self):
+        """Whether a file changed since the last load"""
+        return [_mtime(path) for path in self.paths] != self.mtimes
+
+    def load(self):
+        """(Re)load the files, if one of them changed"""
+        with self.lock:
+            mtimes = [_mtime(path) for path in self.paths]
+            if mtimes == self.mtimes:
+                return
+            entries = {}
+            citekeys = []
+            error = None
+            for path in self.paths:
+                try:
+                    docs = _load(path)
+                except (IOError, OSError, UnicodeDecodeError) as e:
+                    error = '%s: %s' % (path, e)
+                    continue
+                for doc in docs:
+                    citekey = doc.get('id', 'Unknown')
+                    if citekey not in entries:
+                        citekeys.append(citekey)
+                    entries[citekey] = doc
+            formatted_info = dict((citekey, self.formatter.format(doc))
+                                  for citekey, doc in entries.items())
+            search_fields = self.formatter.search_fields
+            (self.citekeys, self.entries, self.formatted_info, self.completion_keys,
+             self.fuzzy_index, self.key_trigrams, self.search_trigrams, self.word_index) = (
+                citekeys, entries, formatted_info, sorted((key.lower(), key) for key in entries),
+                FuzzyIndex(formatted_info), TrigramIndex(['id'], entries),
+                TrigramIndex(search_fields, entries), WordIndex(search_fields, entries))
+            self.mtimes = mtimes
+            self.error = error
+            self.loaded = True
+
+    def complete(self, prefix, limit=100, recent=(), matching='fuzzy'):
+        """
+        Citekeys matching prefix, case insensitive, as Citer's completions
+        match them: fuzzy matching ranks subsequences of the citekey, first
+        author surname and year and title words starting with prefix, other
+        matching values only keep the citekeys containing prefix, those
+        starting with it first. Recently cited citekeys rank higher.
+
+        :param recent: citekeys, most recent first
+        :returns: tuple -- (list of citekeys, whether more matched)
+        """
+        prefix = prefix.lower()
+        bonuses = recency_bonuses(list(reversed(recent)))
+        if matching == 'fuzzy':
+            citekeys, candidates = self.fuzzy_index.search(prefix, limit=limit, bonuses=bonuses)
+            return citekeys, candidates is None or len(candidates) > len(citekeys)
+        matches = citekey_matches(self.completion_keys, self.key_trigrams.candidates(prefix), prefix)
+        return best_citekey_matches(matches, prefix, limit, bonuses), len(matches) > limit
+
+    def search(self, query, limit=500):
+        """
+        Citekeys with a search field containing query, case insensitive,
+        ranked by the relevance of their words to those of query.
+
+        :returns: tuple -- (list of the first limit citekeys, number of matches)
+        """
+        term = query.lower()
+        if not term:
+            return [], 0
+        entries, search_trigrams, word_index = self.entries, self.search_trigrams, self.word_index
+        candidates = search_trigrams.candidates(term)
+        if candidates is None:
+            candidates = list(entries)
+        matches = word_index.rank(query, containing(
+            entries, search_trigrams.fields, term, candidates))
+        return matches[:limit], len(matches)
+
+    def info(self, citekey):
+        """The fields shown for a citekey, None if it is not in the library"""
+        info = self.formatted_info.get(citekey)
+        if info is None:
+            return None
+        return {'formatted_title': info['formatted_title'], 'title': info['title'],
+                'author': info['author'], 'year': info['year'],
+                'abstract': info['entry'].get('abstract')}
+
+    def unknown(self, citekeys):
+        """The citekeys that are not in the library"""
+        return [citekey for citekey in citekeys if citekey not in self.entries]
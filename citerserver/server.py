@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The citation server: JSON-RPC over a pair of binary streams, see
+:mod:`citerserver` for the protocol.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import traceback
+
+from citerserver import __version__
+from citerserver.library import Formatter, Library
+
+__all__ = ['RPCError', 'Server', 'serve', 'main']
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+
+class Server(object):
+    """
+    Answers the requests read from input, one per line, on output.
+
+    :param poll: seconds between checks of the bib files of the libraries
+    """
+
+    def __init__(self, input, output, poll=1.0):
+        self.input = input
+        self.output = output
+        self.poll = poll
+        self.formatter = Formatter()
+        self.libraries = {}  # (tuple of paths, settings) -> Library
+        self.lock = threading.Lock()  # held while libraries are added
+        self.stopped = threading.Event()
+        self.methods = {
+            'initialize': self.initialize,
+            'open': self.open,
+            'complete': self.complete,
+            'search': self.search,
+            'hover': self.hover,
+            'lint': self.lint,
+            'shutdown': self.shutdown,
+        }
+
+    def serve(self):
+        """Answer requests until shutdown or the end of the input"""
+        watcher = threading.Thread(target=self.watch)
+        watcher.daemon = True
+        watcher.start()
+        try:
+            for line in self.input:
+                if not line.strip():
+                    continue
+                response = self.handle(line)
+                if response is not None:
+                    self.output.write(json.dumps(response).encode('utf-8') + b'\n')
+                    self.output.flush()
+                if self.stopped.is_set():
+                    break
+        finally:
+            self.stopped.set()
+
+    def handle(self, line):
+        """The response to a line, None for a notification"""
+        request_id = None
+        try:
+            try:
+                request = json.loads(line.decode('utf-8') if isinstance(line, bytes) else line)
+            except ValueError as e:
+                raise RPCError(PARSE_ERROR, 'Parse error: %s' % e)
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RPCError(INVALID_REQUEST, 'Invalid request')
+            request_id = request.get('id')
+            method = self.methods.get(request['method'])
+            if method is None:
+                raise RPCError(METHOD_NOT_FOUND, 'Unknown method %s' % request['method'])
+            params = request.get('params') or {}
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, 'Params must be an object')
+            result = method(**params)
+        except RPCError as e:
+            return {'jsonrpc': '2.0', 'id': request_id,
+                    'error': {'code': e.code, 'message': e.message}}
+        except TypeError as e:
+            return {'jsonrpc': '2.0', 'id': request_id,
+                    'error': {'code': INVALID_PARAMS, 'message': str(e)}}
+        except Exception as e:
+            traceback.print_exc()
+            return {'jsonrpc': '2.0', 'id': request_id,
+                    'error': {'code': INTERNAL_ERROR, 'message': str(e)}}
+        if 'id' not in request:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    def library(self, paths, settings=None):
+        """
+        The library of paths, loaded in the background the first time.
+
+        :param settings: dict -- quickview_format and search_fields for this
+        library, instead of those given to initialize
+        """
+        if not isinstance(paths, list):
+            raise RPCError(INVALID_PARAMS, 'paths must be a list')
+        if settings is not None and not isinstance(settings, dict):
+            raise RPCError(INVALID_PARAMS, 'settings must be an object')
+        settings = settings or {}
+        formatter = Formatter(settings.get('quickview_format', self.formatter.quickview_format),
+                              settings.get('search_fields', self.formatter.search_fields))
+        key = (tuple(paths), formatter.quickview_format, tuple(formatter.search_fields))
+        with self.lock:
+            library = self.libraries.get(key)
+            if library is None:
+                library = self.libraries[key] = Library(paths, formatter)
+                self.reload(library)
+        return library
+
+    def reload(self, library):
+        loader = threading.Thread(target=library.load)
+        loader.daemon = True
+        loader.start()
+
+    def watch(self):
+        """Reload the libraries whose files changed, every poll seconds"""
+        while not self.stopped.wait(self.poll):
+            with self.lock:
+                libraries = list(self.libraries.values())
+            for library in libraries:
+                if library.loaded and not library.lock.locked() and library.changed():
+                    self.reload(library)
+
+    # methods
+
+    def initialize(self, quickview_format=None, search_fields=None):
+        if quickview_format is not None:
+            self.formatter.quickview_format = quickview_format
+        if search_fields is not None:
+            self.formatter.search_fields = list(search_fields)
+        with self.lock:
+            # rebuilt with the new settings
+            self.libraries.clear()
+        return {'version': __version__}
+
+    def open(self, paths, settings=None):
+        return {'loading': not self.library(paths, settings).loaded}
+
+    def complete(self, paths, prefix, limit=100, recent=(), matching='fuzzy', settings=None):
+        library = self.library(paths, settings)
+        citekeys, truncated = library.complete(prefix, limit, recent, matching)
+        items = []
+        for citekey in citekeys:
+            info = library.info(citekey)
+            if info is not None:  # unless removed by a reload meanwhile
+                items.append({'citekey': citekey, 'display': info['formatted_title'],
+                              'title': info['title']})
+        return {'loading': not library.loaded, 'items': items, 'truncated': truncated}
+
+    def search(self, paths, query, limit=500, settings=None):
+        library = self.library(paths, settings)
+        citekeys, total = library.search(query, limit)
+        items = []
+        for citekey in citekeys:
+            info = library.info(citekey)
+            if info is not None:
+                items.append({'citekey': citekey, 'display': info['formatted_title']})
+        return {'loading': not library.loaded, 'items': items, 'total': total}
+
+    def hover(self, paths, citekey, settings=None):
+        library = self.library(paths, settings)
+        return {'loading': not library.loaded, 'info': library.info(citekey)}
+
+    def lint(self, paths, citekeys, settings=None):
+        library = self.library(paths, settings)
+        if not library.loaded:
+            return {'loading': True, 'unknown': []}
+        return {'loading': False, 'unknown': library.unknown(citekeys)}
+
+    def shutdown(self):
+        self.stopped.set()
+        return None
+
+
+def serve(poll=1.0):
+    """Serve on the standard input and output"""
+    Server(sys.stdin.buffer, sys.stdout.buffer, poll).serve()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m citerserver',
+        description='Serve the entries of bib files to Citer, over JSON-RPC on stdio.')
+    parser.add_argument('--poll', type=float, default=1.0,
+                        help='seconds between checks for modified bib files (default: 1)')
+    args = parser.parse_args(argv)
+    serve(args.poll)
+    return 0
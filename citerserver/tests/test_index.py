@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from citerserver.index import TrigramIndex, containing
+
+FIELDS = ['id', 'title', 'abstract']
+LETTERS = 'abcdeé '
+
+
+def random_text(rand, length):
+    return ''.join(rand.choice(LETTERS) for _ in range(length))
+
+
+def random_entry(rand, citekey):
+    entry = {'id': citekey, 'title': random_text(rand, rand.randint(0, 40)).title()}
+    if rand.random() < 0.3:
+        # longer than TrigramIndex.LONG_VALUE, kept whole rather than split
+        entry['abstract'] = random_text(rand, 300)
+    return entry
+
+
+class TestTrigramIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(33)
+
+    def assertSameMatches(self, index, entries, query):
+        term = query.lower()
+        expected = [key for key in entries
+                    if any(term in entries[key].get(field, '').lower() for field in FIELDS)]
+        candidates = index.candidates(query)
+        if candidates is None:
+            self.assertLess(len(term), 3)
+            return
+        self.assertEqual(sorted(containing(entries, FIELDS, term, candidates)), sorted(expected))
+
+    def queries(self, entries):
+        rand = self.random
+        for _ in range(50):
+            yield random_text(rand, rand.randint(1, 6))
+        for doc in rand.sample(list(entries.values()), 20):
+            value = doc[rand.choice([field for field in FIELDS if field in doc])]
+            start = rand.randint(0, max(0, len(value) - 3))
+            yield value[start:start + rand.randint(3, 8)].upper()
+
+    def test_same_as_substring(self):
+        rand = self.random
+        entries = dict(('key{0}'.format(i), random_entry(rand, 'key{0}'.format(i)))
+                       for i in range(200))
+        index = TrigramIndex(FIELDS, entries)
+        for query in self.queries(entries):
+            self.assertSameMatches(index, entries, query)
+
+    def test_same_after_edits(self):
+        rand = self.random
+        entries = dict(('key{0}'.format(i), random_entry(rand, 'key{0}'.format(i)))
+                       for i in range(100))
+        index = TrigramIndex(FIELDS, entries)
+        for step in range(5):
+            for key in rand.sample(list(entries), 10):
+                del entries[key]
+                index.remove(key)
+            for key in rand.sample(list(entries), 10):
+                entries[key] = random_entry(rand, key)
+                index.add(key, entries[key])
+            for i in range(10):
+                key = 'new{0}-{1}'.format(step, i)
+                entries[key] = random_entry(rand, key)
+                index.add(key, entries[key])
+            index.prepare()
+            for query in self.queries(entries):
+                self.assertSameMatches(index, entries, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
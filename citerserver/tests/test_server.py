@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from citerserver.client import Client, ServerError
+from citerserver.library import Formatter, Library
+from citerserver.server import Server, METHOD_NOT_FOUND, INVALID_PARAMS, PARSE_ERROR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.dirname(os.path.dirname(HERE))
+ENTRIES = os.path.join(PACKAGE, 'bibtexparser', 'tests', 'data', 'multiple_entries.bib')
+
+
+def wait_loaded(library):
+    for _ in range(200):
+        if library.loaded:
+            return
+        time.sleep(0.01)
+
+
+class TestLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.extra = os.path.join(self.folder, 'extra.bib')
+        with open(self.extra, 'w') as bibfile:
+            bibfile.write('@article{Wigner1938,\n title = {Replaced},\n}\n'
+                          '@article{Smith2001,\n title = {Other},\n author = {Smith, John},\n}\n')
+        self.library = Library([ENTRIES, self.extra], Formatter())
+        self.library.load()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_later_files_win(self):
+        self.assertEqual(self.library.citekeys, ['Yablon2005', 'Wigner1938', 'Toto3000', 'Smith2001'])
+        self.assertEqual(self.library.info('Wigner1938')['title'], 'Replaced')
+
+    def test_complete(self):
+        # the title word "other" starts with o, Toto3000 only has it inside its citekey
+        self.assertEqual(self.library.complete('O'),
+                         (['Smith2001', 'Toto3000', 'Yablon2005'], False))
+        self.assertEqual(self.library.complete('1938'), (['Wigner1938'], False))
+        self.assertEqual(self.library.complete('t', recent=['Smith2001']),
+                         (['Toto3000', 'Smith2001'], False))
+        self.assertEqual(self.library.complete('', limit=2, recent=['Smith2001']),
+                         (['Smith2001', 'Yablon2005'], True))
+
+    def test_complete_substring(self):
+        self.assertEqual(self.library.complete('O', matching='substring'),
+                         (['Toto3000', 'Yablon2005'], False))
+        self.assertEqual(self.library.complete('o', recent=['Yablon2005'], matching='substring'),
+                         (['Yablon2005', 'Toto3000'], False))
+        self.assertEqual(self.library.complete('', limit=2, recent=['Smith2001'],
+                                               matching='substring'),
+                         (['Smith2001', 'Toto3000'], True))
+
+    def test_search(self):
+        self.assertEqual(self.library.search('SMITH, J'), (['Smith2001'], 1))
+        self.assertEqual(self.library.search('smith other'), ([], 0))
+        self.assertEqual(self.library.search('o'), (['Yablon2005', 'Toto3000', 'Smith2001'], 3))
+        self.assertEqual(self.library.search('fusion', limit=0), ([], 1))
+        self.assertEqual(self.library.search(''), ([], 0))
+
+    def test_unknown(self):
+        self.assertEqual(self.library.unknown(['Smith2001', 'Nobody2000']), ['Nobody2000'])
+
+    def test_reload(self):
+        self.assertFalse(self.library.changed())
+        with open(self.extra, 'w') as bibfile:
+            bibfile.write('@article{Doe2020,\n title = {New},\n}\n')
+        os.utime(self.extra, (0, 0))
+        self.assertTrue(self.library.changed())
+        self.library.load()
+        self.assertIn('Doe2020', self.library.entries)
+        self.assertNotIn('Smith2001', self.library.entries)
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(io.BytesIO(), io.BytesIO())
+
+    def call(self, method, **params):
+        return self.server.handle(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method,
+                                              'params': params}))
+
+    def test_queries(self):
+        self.assertEqual(self.call('initialize', quickview_format='{citekey} ({year})')['result'],
+                         {'version': '1.0'})
+        wait_loaded(self.server.library([ENTRIES]))
+        self.assertEqual(self.call('complete', paths=[ENTRIES], prefix='wig')['result'], {
+            'loading': False, 'truncated': False, 'items': [
+                {'citekey': 'Wigner1938', 'display': 'Wigner1938 (1938)',
+                 'title': 'The transition state method'}]})
+        self.assertEqual(self.call('search', paths=[ENTRIES], query='toto')['result'], {
+            'loading': False, 'total': 1, 'items': [
+                {'citekey': 'Toto3000', 'display': 'Toto3000 (n.d.)'}]})
+        self.assertEqual(self.call('hover', paths=[ENTRIES], citekey='Nobody')['result'],
+                         {'loading': False, 'info': None})
+        self.assertEqual(self.call('lint', paths=[ENTRIES], citekeys=['Toto3000', 'Nobody'])['result'],
+                         {'loading': False, 'unknown': ['Nobody']})
+
+    def test_settings(self):
+        settings = {'quickview_format': '{year}: {citekey}'}
+        wait_loaded(self.server.library([ENTRIES], settings))
+        self.assertEqual(self.call('search', paths=[ENTRIES], query='wigner',
+                                   settings=settings)['result']['items'],
+                         [{'citekey': 'Wigner1938', 'display': '1938: Wigner1938'}])
+        self.assertIsNot(self.server.library([ENTRIES]), self.server.library([ENTRIES], settings))
+
+    def test_errors(self):
+        self.assertEqual(self.call('nothing')['error']['code'], METHOD_NOT_FOUND)
+        self.assertEqual(self.call('hover', paths=[ENTRIES])['error']['code'], INVALID_PARAMS)
+        self.assertEqual(self.server.handle('{')['error']['code'], PARSE_ERROR)
+
+    def test_notification(self):
+        self.assertIsNone(self.server.handle(json.dumps({'jsonrpc': '2.0', 'method': 'open',
+                                                         'params': {'paths': [ENTRIES]}})))
+
+
+class TestClient(unittest.TestCase):
+
+    def test_session(self):
+        with Client([sys.executable, '-m', 'citerserver'], cwd=PACKAGE) as client:
+            client.request('open', {'paths': [ENTRIES]}, timeout=5)
+            for _ in range(200):
+                result = client.request('lint', {'paths': [ENTRIES], 'citekeys': ['Nobody']}, timeout=5)
+                if not result['loading']:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(result['unknown'], ['Nobody'])
+            with self.assertRaises(ServerError):
+                client.request('nothing', timeout=5)
+        self.assertFalse(client.alive)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests of Citer's own structures, run outside Sublime with the stand-in
+sublime and sublime_plugin modules of the benchmarks folder.
+"""
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PACKAGE, 'benchmarks'))  # the stand-in sublime modules
+if PACKAGE not in sys.path:
+    sys.path.insert(1, PACKAGE)
+
+import sublime
+import citer
+
+WORDS = ('optical fiber fusion transition state method kernel entropy dynamics '
+         'control field quantum random graph network theory').split()
+
+
+def random_entry(rand, citekey):
+    entry = {
+        'id': citekey,
+        'type': 'article',
+        'author': ' and '.join('{0}, {1}'.format(rand.choice(WORDS).title(), rand.choice('ABC'))
+                               for _ in range(rand.randint(1, 4))),
+        'title': ' '.join(rand.choice(WORDS) for _ in range(rand.randint(2, 6))).capitalize(),
+        'year': str(rand.randint(1950, 2020)),
+    }
+    if rand.random() < 0.3:
+        # longer than TrigramIndex.LONG_VALUE
+        entry['abstract'] = ' '.join(rand.choice(WORDS) for _ in range(60))
+    return entry
+
+
+def write_bib(path, entries, mtime):
+    with io.open(path, 'w', encoding='utf-8') as bibfile:
+        for entry in entries:
+            bibfile.write('@{0}{{{1},\n'.format(entry['type'], entry['id']))
+            for field in ('author', 'title', 'year', 'abstract'):
+                if field in entry:
+                    bibfile.write(' {0} = {{{1}}},\n'.format(field, entry[field]))
+            bibfile.write('}\n\n')
+    # libraries only reload files whose mtime changed
+    os.utime(path, (mtime, mtime))
+
+
+class TestLibraryDelta(unittest.TestCase):
+
+    def setUp(self):
+        citer.refresh_settings()
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'library.bib')
+        self.random = random.Random(28)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def fresh_library(self):
+        """A library loaded from scratch, with a pool of its own"""
+        pool = citer._BIBFILES
+        citer._BIBFILES = citer.BibFilePool(pool.budget)
+        try:
+            library = citer.Library([self.path])
+            library.refresh()
+            library.close()
+        finally:
+            citer._BIBFILES = pool
+        return library
+
+    def assertSameLibrary(self, patched, fresh):
+        self.assertEqual(patched.citekeys, fresh.citekeys)
+        self.assertEqual(patched.entries, fresh.entries)
+        self.assertEqual(patched.completion_keys, fresh.completion_keys)
+        self.assertEqual(patched.menu, fresh.menu)
+        self.assertEqual(patched.formatted_info, fresh.formatted_info)
+        self.assertEqual(patched.word_index.postings, fresh.word_index.postings)
+        self.assertEqual(patched.word_index.lengths, fresh.word_index.lengths)
+        self.assertEqual(patched.word_index.total_length, fresh.word_index.total_length)
+        for query in ['', 'o', 'fu', 'fus', 'state method', 'Quantum', 'ory', 'zzz'] + [
+                key.lower()[:4] for key in self.random.sample(fresh.citekeys, 5)]:
+            self.assertEqual(patched.complete(query), fresh.complete(query))
+            # ties may be ranked differently, since patched entries move last
+            self.assertEqual(sorted(patched.search(query)), sorted(fresh.search(query)))
+            self.assertEqual(sorted(patched.fuzzy_index().search(query)[0]),
+                             sorted(fresh.fuzzy_index().search(query)[0]))
+
+    def test_delta_matches_rebuild(self):
+        rand = self.random
+        entries = [random_entry(rand, 'key{0}'.format(i)) for i in range(300)]
+        write_bib(self.path, entries, 1000000)
+        library = citer.Library([self.path])
+        library.refresh()
+        try:
+            for step in range(12):
+                for _ in range(rand.randint(0, 20)):
+                    del entries[rand.randrange(len(entries))]
+                for entry in rand.sample(entries, rand.randint(0, 20)):
+                    entry.update(random_entry(rand, entry['id']))
+                for _ in range(rand.randint(0, 20)):
+                    entries.insert(rand.randint(0, len(entries)),
+                                   random_entry(rand, 'new{0}'.format(rand.randrange(10 ** 6))))
+                write_bib(self.path, entries, 1000000 + step + 1)
+                self.assertTrue(library.refresh())
+                self.assertSameLibrary(library, self.fresh_library())
+        finally:
+            library.close()
+
+    def test_large_delta_rebuilds(self):
+        rand = self.random
+        entries = [random_entry(rand, 'key{0}'.format(i)) for i in range(100)]
+        write_bib(self.path, entries, 1000000)
+        library = citer.Library([self.path])
+        library.refresh()
+        try:
+            entries = [random_entry(rand, 'other{0}'.format(i))
+                       for i in range(citer.Library.MENU_PATCH_LIMIT + 1)]
+            write_bib(self.path, entries, 1000001)
+            library.refresh()
+            self.assertSameLibrary(library, self.fresh_library())
+        finally:
+            library.close()
+
+
+class TestParseBibliography(unittest.TestCase):
+
+    def test_single(self):
+        self.assertEqual(citer.parse_bibliography('title: T\nbibliography: refs.bib\n'),
+                         ['refs.bib'])
+        self.assertEqual(citer.parse_bibliography('bibliography: "my refs.bib" # main\n'),
+                         ['my refs.bib'])
+
+    def test_flow_list(self):
+        self.assertEqual(citer.parse_bibliography("bibliography: [a.bib, 'b.bib',]\n"),
+                         ['a.bib', 'b.bib'])
+
+    def test_block_list(self):
+        self.assertEqual(citer.parse_bibliography(
+            'bibliography:\n  - a.bib\n  - "b.bib"  # other\nauthor: Me\n  - c.bib\n'),
+            ['a.bib', 'b.bib'])
+
+    def test_missing(self):
+        self.assertEqual(citer.parse_bibliography('title: bibliography: a.bib\n'), [])
+        self.assertEqual(citer.parse_bibliography('bibliography:\ntitle: T\n'), [])
+        self.assertEqual(citer.parse_bibliography('bibliography: []\n'), [])
+
+    def test_paper(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(folder, 'a.bib'), 'w'):
+                pass
+            view = sublime.View(text='---\nbibliography: [a.bib, b.bib]\n---\nText\n',
+                                file_name=os.path.join(folder, 'paper.md'))
+            paper = citer.Paper(view)
+            # b.bib does not exist (yet)
+            self.assertEqual(paper.bibpaths(), [os.path.join(os.path.realpath(folder), 'a.bib')])
+            view.replace(None, sublime.Region(0, 3), '')
+            self.assertEqual(paper.bibpaths(), [])
+            view.close()
+        finally:
+            shutil.rmtree(folder)
+
+
+PIECES = ['word', ' ', ' ', '\n', '@Doe2000', '@key', '[@a; @b]', 'x@y', '.', ',', '@', '-', ']']
+
+
+class TestCitationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(37)
+        self.view = sublime.View(text=self.text(200))
+        citer.CiterCitationChangeListener().attach(sublime.Buffer(self.view))
+        self.index = citer.citation_index(self.view)
+
+    def tearDown(self):
+        citer._CITATIONS.pop(self.view.buffer_id(), None)
+        self.view.close()
+
+    def text(self, pieces):
+        return ''.join(self.random.choice(PIECES) for _ in range(pieces))
+
+    def assertSameAsRescan(self):
+        rescan = citer.CitationIndex(self.view)
+        self.assertEqual(self.index.citations(), rescan.citations())
+        for _ in range(10):
+            point = self.random.randint(0, self.view.size())
+            self.assertEqual(self.index.at(point), rescan.at(point))
+
+    def test_edits(self):
+        rand = self.random
+        self.index.citations()
+        for _ in range(300):
+            begin = rand.randint(0, self.view.size())
+            end = min(self.view.size(), begin + rand.choice([0, 0, 1, 2, 5, 20]))
+            self.view.replace(None, sublime.Region(begin, end), self.text(rand.randint(0, 3)))
+            if rand.random() < 0.3:
+                self.assertSameAsRescan()
+        self.assertSameAsRescan()
+
+    def test_missed_edits(self):
+        self.index.citations()
+        # changed without notifying the listener
+        self.view.text = '@Fred2000 and @Mary2001'
+        self.view.changes += 1
+        self.assertEqual(self.index.citations(), [(0, 9, 'Fred2000'), (14, 23, 'Mary2001')])
+
+
+class TestCitationGroups(unittest.TestCase):
+
+    def test_groups(self):
+        self.assertEqual(citer.citation_groups('See [@a][@b; @c] and [@d].'), [(4, 16)])
+        self.assertEqual(citer.citation_groups('[@a][@b][@c]\n[@d][@e]', 10),
+                         [(10, 22), (23, 31)])
+        self.assertEqual(citer.citation_groups('[@a][see @b, p. 2]'), [(0, 18)])
+
+    def test_not_adjacent(self):
+        self.assertEqual(citer.citation_groups('[@a] [@b]'), [])
+        self.assertEqual(citer.citation_groups('[@a]\n[@b]'), [])
+        self.assertEqual(citer.citation_groups('[@a][b]'), [])
+
+    def test_combine(self):
+        view = sublime.View(text='[@a][@b] and [@c][@d]\n[@e][@f]\n')
+        try:
+            command = citer.CiterCombineCitationsCommand(view)
+            view.selection = sublime.Selection([sublime.Region(16)])
+            command.run(None, around_selections=True)
+            self.assertEqual(view.text, '[@a][@b] and [@c; @d]\n[@e][@f]\n')
+            command.run(None)
+            self.assertEqual(view.text, '[@a; @b] and [@c; @d]\n[@e; @f]\n')
+        finally:
+            view.close()
+
+
+if __name__ == '__main__':
+    unittest.main()